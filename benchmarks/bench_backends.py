@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# Copyright (c) 2026 Francesco Martini
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Compare throughput and peak memory of the parser backends (and of the
+stream extractor) on a synthetic book.
+
+Every run is done in its own process, whose peak resident set size
+is read with the resource module: unlike tracemalloc, it includes
+the memory allocated by C libraries (gumbo, libxml2). Unix only.
+
+Needs the same environment as the tests (see runtests.sh): Sigil's plugin
+launchers in PYTHONPATH and, on Linux, SigilGumboLibPath. Example:
+
+    python benchmarks/bench_backends.py --chapters 200 --paragraphs 300
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'cssUndefinedClasses'))
+
+import core
+import backends
+
+
+def synthetic_chapter(index: int, paragraphs: int, rnd: random.Random) -> str:
+    body = []
+    for i in range(paragraphs):
+        classes = ' '.join(f'c{rnd.randrange(200)}' for _ in range(rnd.randrange(4)))
+        class_attr = f' class="{classes}"' if classes else ''
+        body.append(
+            f'<p{class_attr} id="p{index}_{i}">Lorem ipsum <span class="s{rnd.randrange(50)}">dolor</span> '
+            f'sit amet, <a href="chapter{rnd.randrange(index + 1)}.xhtml#p{index}_{rnd.randrange(i + 1)}">'
+            f'consectetur</a> adipiscing elit.</p>'
+        )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml">\n<head>\n<title>Chapter</title>\n'
+        '<style>.c1 > span { color: red; }</style>\n</head>\n<body>\n'
+        + '\n'.join(body)
+        + '\n</body>\n</html>\n'
+    )
+
+
+def max_rss() -> int:
+    """
+    Peak resident set size of this process, in bytes.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def measure(function, texts: list) -> dict:
+    """
+    Time of a run of function, peak RSS of the process after the run
+    and its increase during the run (the texts are already in memory).
+    """
+    before = max_rss()
+    start = time.perf_counter()
+    function(texts)
+    elapsed = time.perf_counter() - start
+    peak = max_rss()
+    return {'elapsed': elapsed, 'peak': peak, 'increase': peak - before}
+
+
+def extract_with(backend):
+    def extract(texts):
+        for text in texts:
+            core.extract_xhtml_attributes(backend.parse(text), *ATTRS_NAMES, backend=backend)
+    return extract
+
+
+def rewrite_with(backend):
+    def rewrite(texts):
+        for text in texts:
+            document = backend.parse(text)
+            core.remove_attributes_from_tree(document, CLASSES_TO_DELETE, set(), backend)
+            backend.serialize(document)
+    return rewrite
+
+
+def scan(texts):
+    for text in texts:
+        core.scan_xhtml_attributes(text, *ATTRS_NAMES)
+
+
+ATTRS_NAMES = (
+    core.XHTMLAttributes.fragid_container_attrs,
+    core.XHTMLAttributes.idref_container_attrs,
+    core.XHTMLAttributes.idref_list_container_attrs,
+)
+CLASSES_TO_DELETE = {f'c{i}' for i in range(0, 200, 2)}
+
+
+def available_runs() -> dict:
+    runs = {'stream extractor': scan}
+    for name in backends.BACKENDS:
+        backend = backends.get_backend(name)
+        if backend.name != name:
+            continue
+        runs[f'{name} extract'] = extract_with(backend)
+        if isinstance(backend, backends.RewriteBackend):
+            runs[f'{name} rewrite'] = rewrite_with(backend)
+    return runs
+
+
+def synthetic_book(args) -> list:
+    rnd = random.Random(args.seed)
+    return [synthetic_chapter(i, args.paragraphs, rnd) for i in range(args.chapters)]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chapters', type=int, default=100)
+    parser.add_argument('--paragraphs', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--run', help='do only this run and print its results as json')
+    return parser.parse_args()
+
+
+def run_in_process(label: str, args) -> dict:
+    command = [
+        sys.executable, __file__, '--run', label,
+        '--chapters', str(args.chapters), '--paragraphs', str(args.paragraphs), '--seed', str(args.seed)
+    ]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    args = parse_args()
+    if args.run:
+        texts = synthetic_book(args)
+        result = measure(available_runs()[args.run], texts)
+        info = core.decode_fragid.cache_info()
+        result['fragid'] = [info.hits, info.misses]
+        print(json.dumps(result))
+        return
+    texts = synthetic_book(args)
+    size = sum(len(text.encode('utf-8')) for text in texts) / 1024 / 1024
+    del texts
+    print(f'{args.chapters} chapters, {size:.1f} MB')
+    mb = 1024 * 1024
+    for label in available_runs():
+        result = run_in_process(label, args)
+        print(
+            f'{label:<24} {result["elapsed"]:8.2f} s {size / result["elapsed"]:8.2f} MB/s '
+            f'{result["peak"] / mb:8.1f} MB peak RSS (+{result["increase"] / mb:.1f} MB during the run)'
+        )
+        hits, misses = result['fragid']
+        if hits or misses:
+            print(f'{"":<24} decoded fragment identifiers: {hits} hits, {misses} misses')
+
+
+if __name__ == '__main__':
+    main()
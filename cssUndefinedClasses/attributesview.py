@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# Copyright (c) 2026 Francesco Martini
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Model and view of the lists of classes and ids found by the plugin.
+
+Rows are painted by a delegate, so that the cost of displaying a list
+doesn't depend on how many attributes it contains.
+"""
+
+import math
+
+from plugin_utils import QtWidgets, QtCore, QtGui, Qt
+import utils
+
+
+class AttributesModel(QtCore.QAbstractListModel):
+    """
+    Checkable list of the classes (or ids) in attributes[attr_type],
+    with the files where they were found (from attributes['info_' + attr_type]).
+    All the attributes are checked at the beginning.
+    """
+
+    def __init__(self, attributes: dict, attr_type: str, parent=None):
+        super().__init__(parent)
+        self._names = sorted(attributes[attr_type])
+        self._info = attributes.get(f'info_{attr_type}', {})
+        self._checked = [True] * len(self._names)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._names)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return self.text(row)
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if self._checked[row] else Qt.Unchecked
+        if role == Qt.ToolTipRole:
+            return self._names[row]
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.CheckStateRole:
+            return False
+        self._checked[index.row()] = Qt.CheckState(value) == Qt.Checked
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+    def text(self, row: int) -> str:
+        """
+        Text of a row: the attribute and the files where it was found.
+        It's built only when a row has to be displayed.
+        """
+        attr = self._names[row]
+        occurrences = ', '.join(
+            f'{utils.href_to_basename(filename)} ({times})'
+            for filename, times in self._info.get(attr, {}).items()
+        )
+        return f'{attr}  -  Found in: {occurrences}'
+
+    def name(self, row: int) -> str:
+        return self._names[row]
+
+    def isChecked(self, row: int) -> bool:
+        return self._checked[row]
+
+    def setAllChecked(self, checked: bool) -> None:
+        if not self._names:
+            return
+        self._checked = [bool(checked)] * len(self._names)
+        self.dataChanged.emit(self.index(0), self.index(len(self._names) - 1), [Qt.CheckStateRole])
+
+    def uncheckedAttributes(self) -> list:
+        return [name for name, checked in zip(self._names, self._checked) if not checked]
+
+
+class AttributesDelegate(QtWidgets.QStyledItemDelegate):
+    """
+    Paints a check indicator and the text of a row, wrapped at word
+    boundaries or, for words longer than the row, anywhere.
+    The whole row toggles the check state when clicked.
+    """
+
+    width_step = 16
+
+    def __init__(self, margins=(8, 6, 8, 6), spacing=12, parent=None):
+        super().__init__(parent)
+        self.margins = margins
+        self.spacing = spacing
+        # row: width of its text in one line
+        self._advances = {}
+        # (row, width): height of the text wrapped at width
+        self._heights = {}
+        self._check = None
+
+    def _check_size(self, option) -> QtCore.QSize:
+        if self._check is None:
+            style = option.widget.style() if option.widget else QtWidgets.QApplication.style()
+            self._check = QtCore.QSize(
+                style.pixelMetric(QtWidgets.QStyle.PM_IndicatorWidth, option, option.widget),
+                style.pixelMetric(QtWidgets.QStyle.PM_IndicatorHeight, option, option.widget)
+            )
+        return self._check
+
+    def _text_layout(self, text: str, font: QtGui.QFont, width: int) -> tuple:
+        """
+        Lay out text in lines of the given width.
+        Return the layout and its height.
+        """
+        layout = QtGui.QTextLayout(text, font)
+        text_option = QtGui.QTextOption()
+        text_option.setWrapMode(QtGui.QTextOption.WrapAtWordBoundaryOrAnywhere)
+        layout.setTextOption(text_option)
+        height = 0.0
+        layout.beginLayout()
+        while True:
+            line = layout.createLine()
+            if not line.isValid():
+                break
+            line.setLineWidth(max(width, 1))
+            line.setPosition(QtCore.QPointF(0, height))
+            height += line.height()
+        layout.endLayout()
+        return layout, math.ceil(height)
+
+    def _text_width(self, option, row_width: int) -> int:
+        left, top, right, bottom = self.margins
+        return row_width - left - right - self._check_size(option).width() - self.spacing
+
+    def _row_width(self, option) -> int:
+        view = option.widget
+        if isinstance(view, QtWidgets.QAbstractItemView):
+            return view.viewport().width()
+        return option.rect.width()
+
+    def sizeHint(self, option, index):
+        row = index.row()
+        row_width = self._row_width(option)
+        text_width = self._text_width(option, row_width)
+        advance = self._advances.get(row)
+        if advance is None:
+            # initStyleOption would query the model for every role:
+            # only the text is needed to measure a row
+            advance = option.fontMetrics.horizontalAdvance(index.data(Qt.DisplayRole))
+            self._advances[row] = advance
+        if advance <= text_width:
+            # most rows fit in one line at any width: no need to lay them out
+            text_height = option.fontMetrics.height()
+        else:
+            # wrapped rows are laid out at the width rounded down to a step,
+            # and their heights kept for each step: resizing the view only
+            # measures them again when it crosses a step
+            if text_width > self.width_step:
+                text_width -= text_width % self.width_step
+            text_height = self._heights.get((row, text_width))
+            if text_height is None:
+                layout, text_height = self._text_layout(index.data(Qt.DisplayRole), option.font, text_width)
+                self._heights[row, text_width] = text_height
+        left, top, right, bottom = self.margins
+        return QtCore.QSize(row_width, max(text_height, self._check_size(option).height()) + top + bottom)
+
+    def paint(self, painter, option, index):
+        opt = QtWidgets.QStyleOptionViewItem(option)
+        self.initStyleOption(opt, index)
+        widget = opt.widget
+        style = widget.style() if widget else QtWidgets.QApplication.style()
+        text = opt.text
+        check_state = opt.checkState
+
+        # background, selection and focus
+        opt.text = ''
+        opt.features &= ~QtWidgets.QStyleOptionViewItem.HasCheckIndicator
+        style.drawControl(QtWidgets.QStyle.CE_ItemViewItem, opt, painter, widget)
+
+        left, top, right, bottom = self.margins
+        rect = option.rect
+        check_size = self._check_size(opt)
+        check_opt = QtWidgets.QStyleOptionViewItem(opt)
+        check_opt.rect = QtCore.QRect(rect.left() + left, rect.top() + top, check_size.width(), check_size.height())
+        check_opt.state &= ~(QtWidgets.QStyle.State_On | QtWidgets.QStyle.State_Off)
+        check_opt.state |= QtWidgets.QStyle.State_On if check_state == Qt.Checked else QtWidgets.QStyle.State_Off
+        style.drawPrimitive(QtWidgets.QStyle.PE_IndicatorItemViewItemCheck, check_opt, painter, widget)
+
+        text_left = check_opt.rect.right() + 1 + self.spacing
+        layout, text_height = self._text_layout(text, opt.font, self._text_width(opt, rect.width()))
+        painter.save()
+        if opt.state & QtWidgets.QStyle.State_Selected:
+            painter.setPen(opt.palette.color(QtGui.QPalette.HighlightedText))
+        else:
+            painter.setPen(opt.palette.color(QtGui.QPalette.Text))
+        layout.draw(painter, QtCore.QPointF(text_left, rect.top() + top))
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if not index.flags() & Qt.ItemIsUserCheckable:
+            return False
+        if event.type() == QtCore.QEvent.MouseButtonRelease:
+            # Qt 6 deprecates QMouseEvent.pos(), Qt 5 has no position()
+            pos = event.position().toPoint() if hasattr(event, 'position') else event.pos()
+            if event.button() != Qt.LeftButton or not option.rect.contains(pos):
+                return False
+        elif event.type() == QtCore.QEvent.MouseButtonDblClick:
+            # don't toggle twice
+            return True
+        elif event.type() == QtCore.QEvent.KeyPress:
+            if event.key() not in (Qt.Key_Space, Qt.Key_Select):
+                return False
+        else:
+            return False
+        checked = Qt.CheckState(index.data(Qt.CheckStateRole)) == Qt.Checked
+        return model.setData(index, Qt.Unchecked if checked else Qt.Checked, Qt.CheckStateRole)
+
+
+class AttributesView(QtWidgets.QListView):
+    """
+    List view of an AttributesModel. Rows are laid out in batches,
+    so that the first ones are displayed without waiting for
+    the others to be measured.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setItemDelegate(AttributesDelegate(parent=self))
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollPerPixel)
+        self.setResizeMode(QtWidgets.QListView.Adjust)
+        self.setLayoutMode(QtWidgets.QListView.Batched)
+        self.setBatchSize(100)
+        self.setAlternatingRowColors(True)
+        self.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
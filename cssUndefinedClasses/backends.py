@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# Copyright (c) 2026 Francesco Martini
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Parser backends: small wrappers that give the rest of the plugin
+a common interface to parse and inspect xhtml files with different
+libraries (ExtractionBackend) and, for the libraries whose trees can be
+written back, to edit and serialize them (RewriteBackend).
+"""
+
+from abc import ABC, abstractmethod
+
+import regex as re
+import sigil_bs4
+import sigil_gumbo_bs4_adapter as gumbo_bs4
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    etree = None
+
+import markupscanner
+
+
+class ExtractionBackend(ABC):
+    """
+    Interface of the parser backends, as far as extracting values goes.
+    Elements and documents are whatever objects the underlying library uses.
+    """
+
+    name = ''
+
+    @abstractmethod
+    def parse(self, text: str):
+        """Parse a xhtml file and return its document."""
+
+    @abstractmethod
+    def iter_elements(self, document):
+        """Yield all the elements of document, in document order."""
+
+    @abstractmethod
+    def tag_name(self, element) -> str:
+        pass
+
+    @abstractmethod
+    def attributes(self, element):
+        """
+        Mapping of the attributes of element. Depending on the backend,
+        values of multi-valued attributes may be lists.
+        """
+
+    @abstractmethod
+    def classes(self, element) -> list:
+        """List of the class names of element."""
+
+    @abstractmethod
+    def get_attribute(self, element, name: str, default=None) -> str:
+        pass
+
+    @abstractmethod
+    def text(self, element) -> str:
+        """Text content of an element with a single text node (e.g. <style>)."""
+
+
+class RewriteBackend(ExtractionBackend):
+    """
+    Interface of the parser backends whose trees can be edited
+    and written back to the files.
+    """
+
+    @abstractmethod
+    def set_attribute(self, element, name: str, value: str) -> None:
+        pass
+
+    @abstractmethod
+    def delete_attribute(self, element, name: str) -> None:
+        pass
+
+    @abstractmethod
+    def serialize(self, document) -> str:
+        pass
+
+
+class GumboBackend(RewriteBackend):
+    """
+    Sigil's gumbo parser with bs4 trees (the default backend).
+    """
+
+    name = 'gumbo'
+
+    def parse(self, text: str) -> sigil_bs4.BeautifulSoup:
+        return gumbo_bs4.parse(text)
+
+    def iter_elements(self, document: sigil_bs4.BeautifulSoup):
+        return document.find_all(True)
+
+    def tag_name(self, element: sigil_bs4.Tag) -> str:
+        return element.name
+
+    def attributes(self, element: sigil_bs4.Tag) -> dict:
+        return element.attrs
+
+    def classes(self, element: sigil_bs4.Tag) -> list:
+        classes = element.get('class', [])
+        if isinstance(classes, str):
+            classes = [classes]
+        return classes
+
+    def get_attribute(self, element: sigil_bs4.Tag, name: str, default=None) -> str:
+        value = element.get(name, default)
+        if isinstance(value, list):
+            value = ' '.join(value)
+        return value
+
+    def set_attribute(self, element: sigil_bs4.Tag, name: str, value: str) -> None:
+        element[name] = value
+
+    def delete_attribute(self, element: sigil_bs4.Tag, name: str) -> None:
+        del element[name]
+
+    def text(self, element: sigil_bs4.Tag) -> str:
+        try:
+            return str(element.contents[0])
+        except IndexError:
+            return ''
+
+    def serialize(self, document: sigil_bs4.BeautifulSoup) -> str:
+        return document.serialize_xhtml()
+
+
+class LxmlDocument:
+    """
+    A xhtml file parsed by lxml.html: the root element, plus the source text
+    that precedes it (xml declaration, doctype, comments).
+    """
+
+    def __init__(self, root, prolog: str = '') -> None:
+        self.root = root
+        self.prolog = prolog
+
+
+class LxmlBackend(ExtractionBackend):
+    """
+    libxml2's html parser, through lxml trees. It's only used to extract values:
+    libxml2 lowercases the names of foreign attributes (viewBox) and neither
+    its html nor its xml serialization can be read back by an html5 parser
+    (empty elements like <title></title> become self-closing tags,
+    > is escaped in <style>), so the trees are never written back.
+    """
+
+    name = 'lxml'
+
+    def __init__(self) -> None:
+        if etree is None:
+            raise ImportError('lxml is not available')
+        self._parser = lxml.html.HTMLParser(encoding='utf-8', remove_comments=False)
+
+    def parse(self, text: str) -> LxmlDocument:
+        root_tag = next(markupscanner.iter_start_tags(text), None)
+        prolog = text[:root_tag.start] if root_tag else ''
+        return LxmlDocument(lxml.html.document_fromstring(text.encode('utf-8'), parser=self._parser), prolog)
+
+    def iter_elements(self, document: LxmlDocument):
+        return document.root.iter(etree.Element)
+
+    def tag_name(self, element) -> str:
+        return element.tag
+
+    def attributes(self, element):
+        return element.attrib
+
+    def classes(self, element) -> list:
+        return [class_ for class_ in re.split(r'[ \r\n\t\f]+', element.get('class', '')) if class_]
+
+    def get_attribute(self, element, name: str, default=None) -> str:
+        return element.get(name, default)
+
+    def text(self, element) -> str:
+        return element.text or ''
+
+
+BACKENDS = {
+    GumboBackend.name: GumboBackend,
+    LxmlBackend.name: LxmlBackend,
+}
+
+
+def can_serialize(name: str) -> bool:
+    """
+    Whether the trees parsed by the backend called name can be written back.
+    """
+    return issubclass(BACKENDS.get(name, GumboBackend), RewriteBackend)
+
+
+def get_backend(name: str = GumboBackend.name) -> ExtractionBackend:
+    """
+    Instance of the backend called name. Unknown or unavailable
+    backends fall back to the default one.
+    """
+    try:
+        return BACKENDS[name]()
+    except (KeyError, ImportError) as E:
+        print(f'Parser backend {name} not available ({E}), using {GumboBackend.name}.')
+        return GumboBackend()
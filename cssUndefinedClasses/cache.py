@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# Copyright (c) 2026 Francesco Martini
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Caches shared by the different phases of the plugin.
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+from pathlib import Path
+from collections import OrderedDict
+
+
+# Memory taken by a bs4 tree, per tag of its source: measured with
+# tracemalloc on trees of sample books, it accounts for most of the tree
+# (sources rich in markup take more than 30 times their size in memory).
+TREE_SIZE_PER_TAG = 800
+
+
+def estimated_tree_size(text: str) -> int:
+    """
+    Estimate in bytes of the memory taken by the bs4 tree parsed from text
+    (within about 30% for the books measured).
+    """
+    return len(text) + TREE_SIZE_PER_TAG * text.count('<')
+
+
+class DocumentCache:
+    """
+    Least recently used cache of parsed documents.
+
+    The cache is bounded by the total of the sizes given to put,
+    the memory taken by each document (see estimated_tree_size):
+    when a new document would exceed max_size, the least recently used
+    documents are evicted.
+    """
+
+    default_max_size = 64 * 1024 * 1024
+
+    def __init__(self, max_size: int = default_max_size) -> None:
+        self.max_size = max_size
+        self.size = 0
+        self._documents = OrderedDict()
+
+    def __contains__(self, key) -> bool:
+        return key in self._documents
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def get(self, key, default=None):
+        try:
+            document, size = self._documents[key]
+        except KeyError:
+            return default
+        self._documents.move_to_end(key)
+        return document
+
+    def pop(self, key, default=None):
+        try:
+            document, size = self._documents.pop(key)
+        except KeyError:
+            return default
+        self.size -= size
+        return document
+
+    def put(self, key, document, size: int) -> None:
+        """
+        Store document under key. Documents bigger than
+        the whole cache are not stored at all.
+        """
+        self.pop(key)
+        if size > self.max_size:
+            return
+        while self._documents and self.size + size > self.max_size:
+            evicted_key, (evicted, evicted_size) = self._documents.popitem(last=False)
+            self.size -= evicted_size
+        self._documents[key] = (document, size)
+        self.size += size
+
+    def clear(self) -> None:
+        self._documents.clear()
+        self.size = 0
+
+
+class ExtractionCache:
+    """
+    On-disk cache of the values extracted from the files of a book,
+    keyed by a hash of the file content and of the settings
+    used for the extraction.
+
+    Entries are stored in a sqlite database, one row per entry: get()
+    reads only the entry asked for, and save() writes only the entries
+    added since the cache was opened. Values must be serializable as json.
+    The database is bounded by the size of the stored values: save() drops
+    the least recently used entries beyond max_size bytes.
+    Errors of the database are not fatal: the cache just stays empty.
+    """
+
+    version = 2
+    default_max_size = 32 * 1024 * 1024
+
+    def __init__(self, path, max_size: int = default_max_size) -> None:
+        self.path = Path(path)
+        self.max_size = max_size
+        self._connection = None
+        self._broken = False
+        self._new = {}  # key: value serialized as json, not saved yet
+        self._used = set()  # keys read from the database
+
+    @classmethod
+    def make_key(cls, text, *settings) -> str:
+        """
+        Hash of the file content (str or bytes) and of the json
+        serializable settings that affect the extracted values.
+        """
+        h = hashlib.blake2b(digest_size=20)
+        h.update(json.dumps([cls.version, settings]).encode())
+        h.update(text.encode('utf-8', 'surrogatepass') if isinstance(text, str) else text)
+        return h.hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open the database on first use (None if it can't be used).
+        Databases of other versions are emptied.
+        """
+        if self._connection is None and not self._broken:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                connection = sqlite3.connect(self.path)
+                try:
+                    with connection:
+                        if connection.execute('PRAGMA user_version').fetchone()[0] != self.version:
+                            connection.execute('DROP TABLE IF EXISTS entries')
+                            connection.execute('PRAGMA user_version = {:d}'.format(self.version))
+                        connection.execute(
+                            'CREATE TABLE IF NOT EXISTS entries '
+                            '(key TEXT PRIMARY KEY, value TEXT, size INTEGER, used REAL)'
+                        )
+                except sqlite3.Error:
+                    connection.close()
+                    raise
+            except (OSError, sqlite3.Error) as E:
+                print(f'Unable to use the cache in {self.path}: {E}')
+                self._broken = True
+                if isinstance(E, sqlite3.DatabaseError) and not isinstance(E, sqlite3.OperationalError):
+                    # not a database, or a corrupted one: start from scratch next time
+                    try:
+                        self.path.unlink()
+                    except OSError:
+                        pass
+            else:
+                self._connection = connection
+        return self._connection
+
+    def get(self, key, default=None):
+        try:
+            return json.loads(self._new[key])
+        except KeyError:
+            pass
+        connection = self._connect()
+        if connection is None:
+            return default
+        try:
+            row = connection.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+            value = json.loads(row[0]) if row is not None else default
+        except (sqlite3.Error, ValueError):
+            return default
+        if row is not None:
+            self._used.add(key)
+        return value
+
+    def put(self, key, value) -> None:
+        self._new[key] = json.dumps(value, separators=(',', ':'))
+
+    def save(self) -> None:
+        """
+        Write the new entries and the last use of the entries read,
+        drop the least recently used entries beyond max_size
+        and close the database.
+        """
+        if not self._new and not self._used:
+            self.close()
+            return
+        connection = self._connect()
+        if connection is None:
+            return
+        now = time.time()
+        try:
+            with connection:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO entries (key, value, size, used) VALUES (?, ?, ?, ?)',
+                    ((key, value, len(value), now) for key, value in self._new.items())
+                )
+                connection.executemany(
+                    'UPDATE entries SET used = ? WHERE key = ?',
+                    ((now, key) for key in self._used if key not in self._new)
+                )
+                size = connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+                if size > self.max_size:
+                    evicted = []
+                    for key, entry_size in connection.execute('SELECT key, size FROM entries ORDER BY used, rowid'):
+                        if size <= self.max_size:
+                            break
+                        evicted.append((key,))
+                        size -= entry_size
+                    connection.executemany('DELETE FROM entries WHERE key = ?', evicted)
+            if connection.execute('PRAGMA freelist_count').fetchone()[0] > 1024:
+                connection.execute('VACUUM')
+        except sqlite3.Error as E:
+            print(f'Unable to save the cache in {self.path}: {E}')
+        self._new.clear()
+        self._used.clear()
+        self.close()
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
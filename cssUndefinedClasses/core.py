@@ -18,20 +18,43 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import io
 import html
+import functools
 import urllib.parse
+import concurrent.futures
+import multiprocessing
 from typing import MutableMapping
 
 import regex as re
-import sigil_bs4
-import sigil_gumbo_bs4_adapter as gumbo_bs4
 
 try:
     import css_parser
 except ImportError:
     import cssutils as css_parser
 
+from lxml import etree
+
 import utils
+import markupscanner
+import cssscanner
+from backends import ExtractionBackend, RewriteBackend, GumboBackend, get_backend, can_serialize
+from cache import DocumentCache, ExtractionCache, estimated_tree_size
+from progress import Progress, Cancelled, TimeBudgetExceeded, text_size  # noqa: F401 (exceptions of core)
+from matchers import AhoCorasick, PrefixIndex, SuffixIndex
+
+
+# Below this size (in characters) of xhtml to parse,
+# starting a pool of processes costs more than it saves.
+PARALLEL_MIN_SIZE = 2 * 1024 * 1024
+# The same for css (in characters of stylesheets to parse).
+PARALLEL_CSS_MIN_SIZE = 256 * 1024
+# How the workers of the process pools are started. The pools are created
+# from a worker thread of the gui, and forking a multi-threaded process
+# can deadlock the children on locks held by the other threads.
+POOL_START_METHOD = 'spawn'
+# How many urls decode_fragid remembers.
+FRAGID_CACHE_SIZE = 8192
 
 
 class CSSParsingError(Exception):
@@ -106,6 +129,22 @@ class XHTMLAttributes:
         self.info_class_names = {}
         self.info_id_values = {}
 
+    def add_file_attributes(self, href: str, file_attributes: dict) -> None:
+        """
+        Merge the values extracted from a single file
+        (see extract_xhtml_attributes) into the collector.
+        """
+        for class_, occurrences in file_attributes['classes'].items():
+            self.class_names.add(class_)
+            info = self.info_class_names.setdefault(class_, {})
+            info[href] = info.get(href, 0) + occurrences
+        for id_, occurrences in file_attributes['ids'].items():
+            self.id_values.add(id_)
+            info = self.info_id_values.setdefault(id_, {})
+            info[href] = info.get(href, 0) + occurrences
+        self.literal_class_values.update(file_attributes['literal_class_values'])
+        self.fragment_identifier.update(file_attributes['fragment_identifiers'])
+
 
 class CSSAttributes:
 
@@ -139,14 +178,51 @@ class CSSAttributes:
             'contains': set()
         }
 
+    def update(self, other: 'CSSAttributes') -> None:
+        """
+        Merge the values collected by other into self.
+        """
+        for key, values in other.classes.items():
+            self.classes[key].update(values)
+        for key, values in other.ids.items():
+            self.ids[key].update(values)
+
+    def to_dict(self) -> dict:
+        """
+        The collected values as lists, e.g. to be serialized as json.
+        """
+        return {
+            'classes': {key: sorted(values) for key, values in self.classes.items()},
+            'ids': {key: sorted(values) for key, values in self.ids.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, values: dict) -> 'CSSAttributes':
+        """
+        Inverse of to_dict.
+        """
+        attributes = cls()
+        for key, names in values['classes'].items():
+            attributes.classes[key].update(names)
+        for key, names in values['ids'].items():
+            attributes.ids[key].update(names)
+        return attributes
+
 
 class CSSParser:
     """
     Wrapper around css_parser.CSSParser, with the ability
     to extract class names and ids from the parsed selectors,
     plus some helper functions for this plugin.
+
+    With engine='scanner', stylesheets are not parsed by css_parser:
+    the selectors are read by cssscanner, which is much faster
+    and validates only the syntax of selectors and declarations
+    (not the properties and their values).
     """
 
+    engines = ('css_parser', 'scanner')
+
     # These 'ident_token' patterns don't consider unicode escape
     # sequences: they are already resolved by the real css parser.
     full_ident_token = re.compile(
@@ -169,45 +245,165 @@ class CSSParser:
         ''',
         re.VERBOSE
     )
+    # Characters that can start a class, an id or an attribute selector.
+    selector_start = re.compile(r'[.#\[]')
+    # The pattern doesn't take into account the possibility of
+    # escaping the letters 'c', 'l', 'a', 's', 'i', 'd'
+    # (if one wants to hurt themselves...)
+    attribute_selector = re.compile(r'\[(class|id)([~|^$*]?)=')
+    attribute_value_end = {
+        '"': re.compile(r'(?<!\\)"'),
+        "'": re.compile(r"(?<!\\)'"),
+        '': re.compile(r'(?<!\\)]'),
+    }
+    attribute_operators = {
+        '~': 'classes',  # ids have only 'equal'
+        '|': 'equal_or_startswith_and_next_is_dash',
+        '^': 'startswith',
+        '$': 'endswith',
+        '*': 'contains',
+        '': 'equal',
+    }
 
-    def __init__(self, accept_invalid_tokens=True) -> None:
+    def __init__(self, accept_invalid_tokens=True, engine: str = 'css_parser') -> None:
         self.cssparser = css_parser.CSSParser(raiseExceptions=True, validate=False)
+        self.accept_invalid_tokens = accept_invalid_tokens
+        if engine not in self.engines:
+            raise ValueError('Unknown css engine: {}'.format(engine))
+        self.engine = engine
         if accept_invalid_tokens:
             self.ident_token = self.simpler_ident_token
         else:
             self.ident_token = self.full_ident_token
+        # values extracted from <style> elements, keyed by the hash of their content
+        self._styles = {}
 
-    def parse_css(self, bk, collector: CSSAttributes = None) -> CSSAttributes:
+    def parse_css(
+            self,
+            bk,
+            collector: CSSAttributes = None,
+            cache: ExtractionCache = None,
+            max_workers: int = 0,
+            progress: Progress = None
+    ) -> CSSAttributes:
         """
         Parse the contents of all css files in epub.
+        If cache is given, stylesheets whose content is unchanged
+        since a previous run are not parsed again.
+        If max_workers is greater than 1 and there is enough to parse,
+        stylesheets are parsed in a pool of worker processes.
+        If progress is given, the stylesheets are reported to it
+        as the 'css' phase (and parsing stops if it's cancelled).
         """
         if not collector:
             collector = CSSAttributes()
+        sheets = []
         for css_id, css_href in bk.css_iter():
+            if progress is not None:
+                progress.check()
+            css_text = utils.read_css(bk, css_id)
+            key = sheet_attributes = None
+            if cache is not None:
+                key = cache.make_key(css_text, self.accept_invalid_tokens, self.engine)
+                cached = cache.get(key)
+                if cached is not None:
+                    sheet_attributes = CSSAttributes.from_dict(cached)
+            sheets.append({
+                'href': css_href,
+                'text': css_text,
+                'size': text_size(css_text) if progress is not None else 0,
+                'key': key,
+                'attributes': sheet_attributes,
+                'reported': False
+            })
+        if progress is not None:
+            progress.start_phase('css', len(sheets), sum(sheet['size'] for sheet in sheets))
+
+        def sheet_done(i):
+            sheets[i]['reported'] = True
+            progress.file_done(sheets[i]['href'], sheets[i]['size'])
+            progress.check()
+
+        pending = [(i, sheet['text']) for i, sheet in enumerate(sheets) if sheet['attributes'] is None]
+        if (
+                max_workers > 1
+                and len(pending) > 1
+                and sum(len(text) for i, text in pending) >= PARALLEL_CSS_MIN_SIZE
+        ):
             try:
-                parsed_css = self.cssparser.parseString(utils.read_css(bk, css_id))
-            except Exception as E:
-                raise CSSParsingError('Error in {}: {}'.format(utils.href_to_basename(css_href), E))
-            for rule in utils.style_rules(parsed_css):
-                for selector in rule.selectorList:
-                    self._parse_selector(selector.selectorText, collector)
+                results = extract_css_in_pool(
+                    pending, max_workers, self.accept_invalid_tokens, self.engine,
+                    sheet_done if progress is not None else None
+                )
+            except (OSError, concurrent.futures.BrokenExecutor) as E:
+                print(f'Unable to parse stylesheets in parallel ({E}), falling back to serial parsing.')
+                # the results of the workers are lost: count every stylesheet again
+                if progress is not None:
+                    for sheet in sheets:
+                        sheet['reported'] = False
+                    progress.start_phase('css', len(sheets), sum(sheet['size'] for sheet in sheets))
+            else:
+                for i in sorted(results):
+                    values, error = results[i]
+                    if error is not None:
+                        filename = utils.href_to_basename(sheets[i]['href'])
+                        raise CSSParsingError('Error in {}: {}'.format(filename, error))
+                    sheets[i]['attributes'] = CSSAttributes.from_dict(values)
+                    if cache is not None:
+                        cache.put(sheets[i]['key'], values)
+
+        for sheet in sheets:
+            if progress is not None and not sheet['reported']:
+                progress.start_file(sheet['href'])
+            if sheet['attributes'] is None:
+                try:
+                    sheet['attributes'] = self.extract_attributes(sheet['text'])
+                except Exception as E:
+                    raise CSSParsingError('Error in {}: {}'.format(utils.href_to_basename(sheet['href']), E))
+                if cache is not None:
+                    cache.put(sheet['key'], sheet['attributes'].to_dict())
+            sheet['text'] = None
+            collector.update(sheet['attributes'])
+            if progress is not None and not sheet['reported']:
+                progress.file_done(sheet['href'], sheet['size'])
+        if progress is not None:
+            progress.end_phase()
         return collector
 
     def parse_style(self, embedded_style: str, collector: CSSAttributes = None, filename: str = '') -> CSSAttributes:
         """
         Parse the content of a style tag.
+        Identical contents (e.g. the same <style> in every chapter)
+        are parsed only once per CSSParser instance.
         """
         if not collector:
             collector = CSSAttributes()
-        try:
-            parsed_css = self.cssparser.parseString(embedded_style)
-        except Exception as E:
-            raise CSSParsingError('Error in style element of {}: {}'.format(filename, E))
-        for rule in utils.style_rules(parsed_css):
-            for selector in rule.selectorList:
-                self._parse_selector(selector.selectorText, collector)
+        key = ExtractionCache.make_key(embedded_style)
+        style_attributes = self._styles.get(key)
+        if style_attributes is None:
+            try:
+                style_attributes = self.extract_attributes(embedded_style)
+            except Exception as E:
+                raise CSSParsingError('Error in style element of {}: {}'.format(filename, E))
+            self._styles[key] = style_attributes
+        collector.update(style_attributes)
         return collector
 
+    def extract_attributes(self, css_text: str) -> CSSAttributes:
+        """
+        Parse a stylesheet and return the classes and ids of its selectors.
+        Parsing errors are raised as they are.
+        """
+        attributes = CSSAttributes()
+        if self.engine == 'scanner':
+            for selector in cssscanner.iter_selectors(css_text):
+                self._parse_selector(selector, attributes)
+            return attributes
+        for rule in utils.style_rules(self.cssparser.parseString(css_text)):
+            for selector in rule.selectorList:
+                self._parse_selector(selector.selectorText, attributes)
+        return attributes
+
     @staticmethod
     def is_not_escaped(token: str, index: int, escape_char: str = '\\'):
         """
@@ -227,237 +423,703 @@ class CSSParser:
         """
         Parse a selector and extract all class and id names,
         which are used to populate classes and ids dictionaries of the collector.
+        The selector is scanned once, from one candidate start of a class,
+        id or attribute selector to the next one.
         """
         i = 0
-        while i < len(selector):
-            start_i = i
+        while True:
+            start = self.selector_start.search(selector, i)
+            if not start:
+                break
+            i = start.start()
             char = selector[i]
+            if not self.is_not_escaped(selector, i):
+                i += 1
+                continue
 
-            # class selector
-            if char == '.' and self.is_not_escaped(selector, i):
-                class_match = self.ident_token.match(selector[i + 1:])
-                if class_match:
-                    collector.classes['classes'].add(utils.css_remove_escapes(class_match.group()))
-                    i += class_match.end() + 1
-
-            # id selector
-            elif char == '#' and self.is_not_escaped(selector, i):
-                id_match = self.ident_token.match(selector[i + 1:])
-                if id_match:
-                    collector.ids['equal'].add(utils.css_remove_escapes(id_match.group()))
-                    i += id_match.end() + 1
+            # class or id selector
+            if char == '.' or char == '#':
+                ident_match = self.ident_token.match(selector, i + 1)
+                if ident_match:
+                    value = utils.css_remove_escapes(ident_match.group())
+                    if char == '.':
+                        collector.classes['classes'].add(value)
+                    else:
+                        collector.ids['equal'].add(value)
+                    i = ident_match.end()
+                    continue
 
             # attribute selector
-            elif char == '[' and self.is_not_escaped(selector, i):
-                fragment = selector[i:]
-                # The pattern doesn't take into account the possibility of
-                # escaping the letters 'c', 'l', 'a', 's', 'i', 'd'
-                # (if one wants to hurt themselves...)
-                attr = re.match(r'\[(?:class|id)[~|^$*]?=', fragment)
+            else:
+                attr = self.attribute_selector.match(selector, i)
                 if attr:
-                    if 'id' in attr.group():
-                        names = collector.ids
-                    else:
-                        names = collector.classes
+                    names = collector.ids if attr.group(1) == 'id' else collector.classes
                     value_start = attr.end()
-                    if fragment[value_start] == '"':
-                        value_start += 1
-                        end_pattern = re.compile(r'(?<!\\)"')
-                    elif fragment[value_start] == "'":
+                    quote = selector[value_start:value_start + 1]
+                    if quote == '"' or quote == "'":
                         value_start += 1
-                        end_pattern = re.compile(r"(?<!\\)'")
                     else:
-                        end_pattern = re.compile(r'(?<!\\)]')
-                    value_end = end_pattern.search(fragment, pos=value_start).end()
-                    value = utils.css_remove_escapes(fragment[value_start:value_end - 1])
-                    if '~' in attr.group():
-                        try:
-                            names['classes'].add(value)
-                        except KeyError:
-                            names['equal'].add(value)
-                    elif '|' in attr.group():
-                        names['equal_or_startswith_and_next_is_dash'].add(value)
-                    elif '^' in attr.group():
-                        names['startswith'].add(value)
-                    elif '$' in attr.group():
-                        names['endswith'].add(value)
-                    elif '*' in attr.group():
-                        names['contains'].add(value)
-                    else:
-                        names['equal'].add(value)
-                    i += value_end
-            if i == start_i:
-                i += 1
+                        quote = ''
+                    value_end = self.attribute_value_end[quote].search(selector, value_start)
+                    if not value_end:
+                        break
+                    value = utils.css_remove_escapes(selector[value_start:value_end.start()])
+                    key = self.attribute_operators[attr.group(2)]
+                    if key not in names:
+                        key = 'equal'
+                    names[key].add(value)
+                    i = value_end.end()
+                    continue
+            i += 1
 
 
-def get_fragid(element: sigil_bs4.Tag, attr_name: str = 'href') -> str:
+def _extract_css_worker(index: int, css_text: str, accept_invalid_tokens: bool, engine: str) -> tuple:
+    """
+    Extract the classes and ids of a single stylesheet in a worker process,
+    as lists (see CSSAttributes.to_dict).
+    Parsing errors are returned as strings, to be raised in the main process.
+    """
     try:
-        return urllib.parse.unquote(urllib.parse.urldefrag(element[attr_name]).fragment)
-    except KeyError:
-        return ''
+        attributes = CSSParser(accept_invalid_tokens, engine).extract_attributes(css_text)
+    except Exception as E:
+        return index, None, str(E)
+    return index, attributes.to_dict(), None
+
+
+def process_pool(max_workers: int) -> concurrent.futures.ProcessPoolExecutor:
+    """
+    Return a pool of max_workers processes started with POOL_START_METHOD.
+    """
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context(POOL_START_METHOD)
+    )
+
+
+def collect_pool_results(executor, futures: list, on_done=None) -> dict:
+    """
+    Wait for futures returning (index, values, error) tuples
+    and return a dictionary index: (values, error).
+    If on_done is given, it's called with the index of every completed task:
+    if it raises, the tasks not yet started are cancelled.
+    """
+    results = {}
+    try:
+        for future in concurrent.futures.as_completed(futures):
+            index, values, error = future.result()
+            results[index] = (values, error)
+            if on_done is not None:
+                on_done(index)
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    return results
+
+
+def extract_css_in_pool(
+        pending: list,
+        max_workers: int,
+        accept_invalid_tokens: bool,
+        engine: str,
+        on_done=None
+) -> dict:
+    """
+    Parse the stylesheets in pending, a list of (index, css_text) tuples,
+    in a pool of worker processes. The biggest stylesheets are scheduled first.
+    Returns a dictionary index: (values, parsing_error).
+    on_done is passed to collect_pool_results.
+    """
+    pending = sorted(pending, key=lambda item: len(item[1]), reverse=True)
+    with process_pool(max_workers) as executor:
+        futures = [
+            executor.submit(_extract_css_worker, index, css_text, accept_invalid_tokens, engine)
+            for index, css_text in pending
+        ]
+        return collect_pool_results(executor, futures, on_done)
+
+
+@functools.lru_cache(maxsize=FRAGID_CACHE_SIZE)
+def decode_fragid(url: str) -> str:
+    """
+    Decoded fragment identifier of url (empty if there's none).
+    Urls repeat a lot in tocs, notes and indexes, so the results are memoized:
+    decode_fragid.cache_info() reports hits and misses since the last
+    decode_fragid.cache_clear(), done at the start of every search.
+    """
+    return urllib.parse.unquote(urllib.parse.urldefrag(url).fragment)
+
+
+def fragid_references(value: str) -> tuple:
+    """Decoded fragment identifier of an url, if any."""
+    fragid = decode_fragid(value)
+    return (fragid,) if fragid else ()
+
+
+def idref_references(value: str) -> tuple:
+    """A single id reference."""
+    return (value,) if value else ()
+
+
+def idref_list_references(value: str) -> list:
+    """A whitespace separated list of id references."""
+    return [ref for ref in re.split(r'[ \r\n\t\f]+', value) if ref]
+
+
+def reference_dispatch(
+        fragid_container_attrs: list,
+        idref_container_attrs: list,
+        idref_list_container_attrs: list
+) -> dict:
+    """
+    Map the name of every attribute that can contain references to
+    the functions that extract them from its value (usually just one,
+    unless the same attribute is configured in more than one list).
+    """
+    dispatch = {}
+    for attrs, function in (
+            (fragid_container_attrs, fragid_references),
+            (idref_container_attrs, idref_references),
+            (idref_list_container_attrs, idref_list_references),
+    ):
+        for attr in attrs:
+            if function not in dispatch.get(attr, ()):
+                dispatch[attr] = dispatch.get(attr, ()) + (function,)
+    return dispatch
+
+
+def iter_references(attributes, dispatch: dict):
+    """
+    Yield the fragment identifiers and id references found in attributes
+    (a mapping of attribute names to values), according to dispatch
+    (see reference_dispatch). Only the attributes actually present
+    are looked up.
+    """
+    for name, value in attributes.items():
+        functions = dispatch.get(name)
+        if functions is None:
+            continue
+        if isinstance(value, list):
+            # multi-valued attributes of bs4 trees
+            value = ' '.join(value)
+        for function in functions:
+            yield from function(value)
+
+
+def literal_class_value(classes: list) -> str:
+    """
+    Textual value of a class attribute, as it would be written by serializing
+    its element: class names are joined by a single space and escaped
+    as in the attribute values of the bs4 minimal formatter.
+    Unlike serializing the element, it doesn't depend on its descendants.
+    """
+    value = ' '.join(classes).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    if '"' in value and "'" in value:
+        value = value.replace('"', '&quot;')
+    return value
+
+
+def reference_attributes(prefs: MutableMapping) -> tuple:
+    """
+    Names of the attributes that can contain fragment identifiers,
+    a single id reference or a list of id references.
+    """
+    return (
+        prefs['fragid_container_attrs'] or XHTMLAttributes.fragid_container_attrs,
+        prefs['idref_container_attrs'] or XHTMLAttributes.idref_container_attrs,
+        prefs['idref_list_container_attrs'] or XHTMLAttributes.idref_list_container_attrs,
+    )
+
+
+def extract_xhtml_attributes(
+        document,
+        fragid_container_attrs: list,
+        idref_container_attrs: list,
+        idref_list_container_attrs: list,
+        gather_only_fragid: bool = False,
+        backend: ExtractionBackend = None
+) -> dict:
+    """
+    Gather classes, ids, fragment identifiers and the content
+    of <style> elements from a single xhtml file, parsed by backend
+    (by default, gumbo).
+    The result contains only dictionaries, lists and strings,
+    so that it can be merged later into a XHTMLAttributes collector
+    or stored as it is.
+    """
+    if backend is None:
+        backend = GumboBackend()
+    dispatch = reference_dispatch(fragid_container_attrs, idref_container_attrs, idref_list_container_attrs)
+    classes_occurrences = {}
+    ids_occurrences = {}
+    literal_class_values = []
+    fragment_identifiers = []
+    styles = []
+    for elem in backend.iter_elements(document):
+        attributes = backend.attributes(elem)
+        # gather fragment identifiers, if present
+        fragment_identifiers.extend(iter_references(attributes, dispatch))
+        if gather_only_fragid:
+            continue
+
+        # tag 'style': gather the css, its classes and ids are parsed later
+        if backend.tag_name(elem) == 'style':
+            style = backend.text(elem)
+            if style:
+                styles.append(style)
+        # gather id value, if present
+        try:
+            id_ = attributes['id']
+        except KeyError:
+            pass
+        else:
+            ids_occurrences[id_] = ids_occurrences.get(id_, 0) + 1
+        # gather class names and textual value of class attribute, if present
+        classes = backend.classes(elem)
+        for class_ in classes:
+            classes_occurrences[class_] = classes_occurrences.get(class_, 0) + 1
+        if classes:
+            literal_class_values.append(literal_class_value(classes))
+    return {
+        'classes': classes_occurrences,
+        'ids': ids_occurrences,
+        # only the distinct values matter (and are stored in the cache)
+        'literal_class_values': list(dict.fromkeys(literal_class_values)),
+        'fragment_identifiers': list(dict.fromkeys(fragment_identifiers)),
+        'styles': styles,
+    }
+
+
+def scan_xhtml_attributes(
+        text: str,
+        fragid_container_attrs: list,
+        idref_container_attrs: list,
+        idref_list_container_attrs: list,
+        gather_only_fragid: bool = False
+) -> dict:
+    """
+    Same as extract_xhtml_attributes, but working on the source text of the file
+    with markupscanner: only start tags, their attributes and the content
+    of <style> elements are read, without building a tree.
+    """
+    dispatch = reference_dispatch(fragid_container_attrs, idref_container_attrs, idref_list_container_attrs)
+    classes_occurrences = {}
+    ids_occurrences = {}
+    literal_class_values = []
+    fragment_identifiers = []
+    styles = []
+    for tag in markupscanner.iter_start_tags(text):
+        attributes = {attr.name: attr.value for attr in tag.attributes}
+        fragment_identifiers.extend(iter_references(attributes, dispatch))
+        if gather_only_fragid:
+            continue
+
+        if tag.name == 'style' and tag.content:
+            styles.append(tag.content)
+        try:
+            id_ = attributes['id']
+        except KeyError:
+            pass
+        else:
+            ids_occurrences[id_] = ids_occurrences.get(id_, 0) + 1
+        classes = [class_ for class_ in re.split(r'[ \r\n\t\f]+', attributes.get('class', '')) if class_]
+        for class_ in classes:
+            classes_occurrences[class_] = classes_occurrences.get(class_, 0) + 1
+        if classes:
+            literal_class_values.append(literal_class_value(classes))
+    return {
+        'classes': classes_occurrences,
+        'ids': ids_occurrences,
+        'literal_class_values': list(dict.fromkeys(literal_class_values)),
+        'fragment_identifiers': list(dict.fromkeys(fragment_identifiers)),
+        'styles': styles,
+    }
+
+
+def scan_xhtml_references(
+        text: str,
+        fragid_container_attrs: list,
+        idref_container_attrs: list,
+        idref_list_container_attrs: list
+) -> dict:
+    """
+    Gather only the fragment identifiers and id references of a xhtml file,
+    searching its source text for the reference attributes alone.
+    The result has the same keys of extract_xhtml_attributes.
+    Values found outside of tags (e.g. in comments) are gathered too:
+    they can only prevent some ids from being deleted.
+    """
+    dispatch = reference_dispatch(fragid_container_attrs, idref_container_attrs, idref_list_container_attrs)
+    fragment_identifiers = []
+    for name, value in markupscanner.iter_attribute_values(text, dispatch):
+        for function in dispatch.get(name, ()):
+            fragment_identifiers.extend(function(value))
+    return {
+        'classes': {},
+        'ids': {},
+        'literal_class_values': [],
+        'fragment_identifiers': list(dict.fromkeys(fragment_identifiers)),
+        'styles': [],
+    }
 
 
-def parse_xhtml(bk, cssparser: CSSParser, css_collector: CSSAttributes, prefs: MutableMapping) -> XHTMLAttributes:
+def _extract_xhtml_worker(
+        index: int,
+        text: str,
+        attrs_names: tuple,
+        gather_only_fragid: bool,
+        extractor: str = 'tree',
+        backend_name: str = GumboBackend.name
+) -> tuple:
+    """
+    Extract the attributes of a single xhtml file in a worker process.
+    Parsing errors are returned as strings, to be raised in the main process.
+    """
+    if extractor == 'stream':
+        return index, scan_xhtml_attributes(text, *attrs_names, gather_only_fragid), None
+    backend = get_backend(backend_name)
+    try:
+        document = backend.parse(text)
+    except Exception as E:
+        return index, None, str(E)
+    return index, extract_xhtml_attributes(document, *attrs_names, gather_only_fragid, backend), None
+
+
+def extract_xhtml_in_pool(
+        pending: list,
+        attrs_names: tuple,
+        max_workers: int,
+        extractor: str = 'tree',
+        backend_name: str = GumboBackend.name,
+        on_done=None
+) -> dict:
+    """
+    Parse the xhtml files in pending, a list of (index, text, gather_only_fragid)
+    tuples, in a pool of worker processes. The biggest files are scheduled first.
+    Returns a dictionary index: (file_attributes, parsing_error).
+    on_done is passed to collect_pool_results.
+    """
+    pending = sorted(pending, key=lambda item: len(item[1]), reverse=True)
+    with process_pool(max_workers) as executor:
+        futures = [
+            executor.submit(
+                _extract_xhtml_worker, index, text, attrs_names, gather_only_fragid, extractor, backend_name
+            )
+            for index, text, gather_only_fragid in pending
+        ]
+        return collect_pool_results(executor, futures, on_done)
+
+
+def parse_xhtml(
+        bk,
+        cssparser: CSSParser,
+        css_collector: CSSAttributes,
+        prefs: MutableMapping,
+        documents: DocumentCache = None,
+        cache: ExtractionCache = None,
+        progress: Progress = None
+) -> XHTMLAttributes:
     """
     Parse all the xhtml files in the epub and gather classes, ids
     and fragment identifiers. Also, gather css classes and ids
     from <style> elements.
+    If documents is given, the parsed trees of the files that
+    can be modified later are stored in it, keyed by their manifest id.
+    If cache is given, files whose content and reference attributes
+    are unchanged since a previous run are not parsed again.
+    If prefs['parallel_workers'] is greater than 1, the files are read
+    beforehand and, if there is enough to parse, parsed in a pool of worker
+    processes (their trees are not stored in documents). Otherwise
+    every file is read only when its turn comes.
+    With prefs['xhtml_extractor'] == 'stream', files are scanned
+    with scan_xhtml_attributes instead of being parsed into trees.
+    Otherwise, they are parsed with the backend in prefs['parser_backend'].
+    Files that are not selected (see prefs['parse_only_selected_files'])
+    are only searched for references with scan_xhtml_references.
+    If progress is given, the files are reported to it
+    as the 'xhtml' phase (and parsing stops if it's cancelled):
+    the total size of the files is known only if they are read beforehand.
     """
     a = XHTMLAttributes()
-    fragid_container_attrs = prefs['fragid_container_attrs'] or a.fragid_container_attrs
-    idref_container_attrs = prefs['idref_container_attrs'] or a.idref_container_attrs
-    idref_list_container_attrs = prefs['idref_list_container_attrs'] or a.idref_list_container_attrs
+    attrs_names = reference_attributes(prefs)
+    extractor = prefs.get('xhtml_extractor', 'tree')
+    backend = get_backend(prefs.get('parser_backend', GumboBackend.name))
+    files = []
     for xhtml_id, xhtml_href in bk.text_iter():
-        filename = utils.href_to_basename(xhtml_href)
-        try:
-            soup = gumbo_bs4.parse(bk.readfile(xhtml_id))
-        except Exception as E:
-            raise XMLParsingError('Error in {}: {}'.format(filename, E))
         if prefs['parse_only_selected_files'] and xhtml_href not in prefs['selected_files']:
             gather_only_fragid = True
         else:
             gather_only_fragid = False
+        files.append({
+            'id': xhtml_id,
+            'href': xhtml_href,
+            'text': None,
+            'size': 0,
+            'gather_only_fragid': gather_only_fragid,
+            'key': None,
+            'attributes': None,
+            'reported': False,
+        })
 
-        for elem in soup.find_all(True):
-            # gather fragment identifiers, if present
-            for attr in fragid_container_attrs:
-                fragid = get_fragid(elem, attr)
-                if fragid:
-                    a.fragment_identifier.add(fragid)
-            for attr in idref_container_attrs:
-                idref = elem.get(attr, '')
-                if idref:
-                    a.fragment_identifier.add(idref)
-            for attr in idref_list_container_attrs:
-                idrefs = elem.get(attr, [])
-                if idrefs:
-                    a.fragment_identifier.update(
-                        ref for ref in re.split(r'[ \r\n\t\f]+', idrefs) if ref
-                    )
-            if gather_only_fragid:
-                continue
+    def read(file) -> str:
+        """
+        Read the text of file and look its values up in the cache
+        (or scan it for references, if it's not selected).
+        """
+        text = bk.readfile(file['id'])
+        if progress is not None:
+            file['size'] = text_size(text)
+        if file['gather_only_fragid']:
+            file['attributes'] = scan_xhtml_references(text, *attrs_names)
+        elif cache is not None:
+            file['key'] = cache.make_key(text, attrs_names, file['gather_only_fragid'], extractor, backend.name)
+            file['attributes'] = cache.get(file['key'])
+        return text
 
-            # tag 'style': gather all css classes and ids
-            if elem.name == 'style':
-                try:
-                    style = elem.contents[0]
-                except IndexError:
-                    pass
-                else:
-                    cssparser.parse_style(style, css_collector, filename)
-            # gather id value, if present
+    # Only the files to send to a pool are read beforehand:
+    # otherwise every file is read when its turn comes.
+    max_workers = prefs.get('parallel_workers', 0)
+    if max_workers > 1:
+        for file in files:
+            if progress is not None:
+                progress.check()
+            text = read(file)
+            if file['attributes'] is None:
+                file['text'] = text
+        total_bytes = sum(file['size'] for file in files)
+    else:
+        total_bytes = None
+    if progress is not None:
+        progress.start_phase('xhtml', len(files), total_bytes)
+
+    def file_done(i):
+        files[i]['reported'] = True
+        progress.file_done(files[i]['href'], files[i]['size'])
+        progress.check()
+
+    pending = [
+        (i, file['text'], file['gather_only_fragid'])
+        for i, file in enumerate(files) if file['text'] is not None
+    ]
+    if (
+            len(pending) > 1
+            and sum(len(text) for i, text, gather_only_fragid in pending) >= PARALLEL_MIN_SIZE
+    ):
+        try:
+            results = extract_xhtml_in_pool(
+                pending, attrs_names, max_workers, extractor, backend.name,
+                file_done if progress is not None else None
+            )
+        except (OSError, concurrent.futures.BrokenExecutor) as E:
+            print(f'Unable to parse files in parallel ({E}), falling back to serial parsing.')
+            # the results of the workers are lost: count every file again
+            if progress is not None:
+                for file in files:
+                    file['reported'] = False
+                progress.start_phase('xhtml', len(files), total_bytes)
+        else:
+            for i in sorted(results):
+                file_attributes, error = results[i]
+                if error is not None:
+                    raise XMLParsingError('Error in {}: {}'.format(utils.href_to_basename(files[i]['href']), error))
+                files[i]['attributes'] = file_attributes
+                files[i]['text'] = None
+                if cache is not None:
+                    cache.put(files[i]['key'], file_attributes)
+    del pending
+
+    for file in files:
+        if progress is not None and not file['reported']:
+            progress.start_file(file['href'])
+        filename = utils.href_to_basename(file['href'])
+        text = file['text']
+        if text is None and file['attributes'] is None:
+            text = read(file)
+        if file['attributes'] is None and extractor == 'stream':
+            file['attributes'] = scan_xhtml_attributes(text, *attrs_names, file['gather_only_fragid'])
+            if cache is not None:
+                cache.put(file['key'], file['attributes'])
+        elif file['attributes'] is None:
             try:
-                id_ = elem['id']
-            except KeyError:
-                pass
-            else:
-                if id_ in a.id_values:
-                    try:
-                        a.info_id_values[id_][xhtml_href] += 1
-                    except KeyError:
-                        a.info_id_values[id_][xhtml_href] = 1
-                else:
-                    a.info_id_values[id_] = {xhtml_href: 1}
-                    a.id_values.add(id_)
-            # gather class names and textual value of class attribute, if present
-            classes = elem.get('class', [])
-            if isinstance(classes, str):
-                classes = [classes]
-            for class_ in classes:
-                if class_ in a.class_names:
-                    try:
-                        a.info_class_names[class_][xhtml_href] += 1
-                    except KeyError:
-                        a.info_class_names[class_][xhtml_href] = 1
-                else:
-                    a.info_class_names[class_] = {xhtml_href: 1}
-                    a.class_names.add(class_)
-            if classes:
-                try:
-                    literal_class_value = re.search(r'class=([\'"])(.+?)\1', str(elem)).group(2)
-                except AttributeError:
-                    pass
-                else:
-                    a.literal_class_values.add(literal_class_value)
+                document = backend.parse(text)
+            except Exception as E:
+                raise XMLParsingError('Error in {}: {}'.format(filename, E))
+            if documents is not None and not file['gather_only_fragid']:
+                documents.put(file['id'], document, estimated_tree_size(text))
+            file['attributes'] = extract_xhtml_attributes(
+                document, *attrs_names, file['gather_only_fragid'], backend
+            )
+            if cache is not None:
+                cache.put(file['key'], file['attributes'])
+        file['text'] = None
+        a.add_file_attributes(file['href'], file['attributes'])
+        for style in file['attributes']['styles']:
+            cssparser.parse_style(style, css_collector, filename)
+        if progress is not None and not file['reported']:
+            progress.file_done(file['href'], file['size'])
+    if progress is not None:
+        progress.end_phase()
     a.class_names.discard('')
     a.literal_class_values.discard('')
     return a
 
 
-def parse_xml(bk: 'BookContainer', collector: XHTMLAttributes, prefs: MutableMapping) -> XHTMLAttributes:
-    fragid_container_attrs = prefs['fragid_container_attrs'] or collector.fragid_container_attrs
-    idref_container_attrs = prefs['idref_container_attrs'] or collector.idref_container_attrs
-    idref_list_container_attrs = prefs['idref_list_container_attrs'] or collector.idref_list_container_attrs
+def iter_xml_attributes(data) -> dict:
+    """
+    Yield the attributes of every element of a xml document (str or bytes),
+    as dictionaries with the same names used by bs4 ('epub:textref'),
+    streaming the document with lxml's iterparse instead of building a tree:
+    elements are discarded as soon as they are closed.
+    Empty or blank documents have no elements (lxml would raise an error).
+    """
+    if isinstance(data, str):
+        data, encoding = data.encode('utf-8'), 'utf-8'
+    else:
+        encoding = None
+    if not data.strip():
+        return
+    prefixes = {'http://www.w3.org/XML/1998/namespace': 'xml'}
+    names = {}
+    context = etree.iterparse(
+        io.BytesIO(data),
+        events=('start-ns', 'start', 'end'),
+        encoding=encoding,
+        recover=True,
+        huge_tree=True,
+        resolve_entities=False
+    )
+    for event, item in context:
+        if event == 'start':
+            attributes = {}
+            for key, value in item.attrib.items():
+                try:
+                    name = names[key]
+                except KeyError:
+                    if key.startswith('{'):
+                        uri, local_name = key[1:].split('}', 1)
+                        prefix = prefixes.get(uri)
+                        name = f'{prefix}:{local_name}' if prefix else local_name
+                    else:
+                        name = key
+                    names[key] = name
+                attributes[name] = value
+            yield attributes
+        elif event == 'end':
+            item.clear()
+            while item.getprevious() is not None:
+                del item.getparent()[0]
+        else:
+            prefix, uri = item
+            if prefix and uri not in prefixes:
+                prefixes[uri] = prefix
+                names.clear()
+
+
+def parse_xml(
+        bk: 'BookContainer',
+        collector: XHTMLAttributes,
+        prefs: MutableMapping,
+        progress: Progress = None
+) -> XHTMLAttributes:
+    """
+    Gather fragment identifiers and id references from the xml files
+    in the epub that are not xhtml (ncx, media overlays, svg...).
+    Files are streamed with lxml (see iter_xml_attributes).
+    If progress is given, the files are reported to it as the 'xml' phase
+    (their total size is not known in advance).
+    """
+    dispatch = reference_dispatch(*reference_attributes(prefs))
     xhtml_files = set(id_ for id_, href in bk.text_iter())
-    for file_id, href, mime in bk.manifest_iter():
-        # if file is xhtml or not xml, skip ahead
-        if file_id in xhtml_files or not re.search(r'[/+]xml\b', mime):
-            continue
+    # if file is xhtml or not xml, skip ahead
+    xml_files = [
+        (file_id, href) for file_id, href, mime in bk.manifest_iter()
+        if file_id not in xhtml_files and re.search(r'[/+]xml\b', mime)
+    ]
+    if progress is not None:
+        progress.start_phase('xml', len(xml_files))
+    for file_id, href in xml_files:
+        if progress is not None:
+            progress.start_file(href)
+        data = bk.readfile(file_id)
         try:
-            soup = sigil_bs4.BeautifulSoup(bk.readfile(file_id), 'lxml-xml')
+            for attributes in iter_xml_attributes(data):
+                collector.fragment_identifier.update(iter_references(attributes, dispatch))
         except Exception as E:
             raise XMLParsingError('Error in {}: {}'.format(utils.href_to_basename(href), E))
-        for elem in soup.find_all(True):
-            # gather fragment identifiers, if present
-            for attr in fragid_container_attrs:
-                fragid = get_fragid(elem, attr)
-                if fragid:
-                    collector.fragment_identifier.add(fragid)
-            for attr in idref_container_attrs:
-                idref = elem.get(attr, '')
-                if idref:
-                    collector.fragment_identifier.add(idref)
-            for attr in idref_list_container_attrs:
-                idrefs = elem.get(attr, [])
-                if idrefs:
-                    collector.fragment_identifier.update(
-                        ref for ref in re.split(r'[ \r\n\t\f]+', idrefs) if ref
-                    )
+        if progress is not None:
+            progress.file_done(href, text_size(data))
+    if progress is not None:
+        progress.end_phase()
     return collector
 
 
 def match_attribute_selectors(css_attributes: dict, xhtml_attribute_names: set) -> set:
-    attrs_to_delete = xhtml_attribute_names.copy()
+    """
+    Return the values in xhtml_attribute_names that are not matched by any
+    of the values of css attribute selectors in css_attributes (see CSSAttributes).
+    Indexes of the css values are built once, so that every xhtml value
+    is compared in time linear in its length.
+    """
+    equal = css_attributes['equal']
+    dash = PrefixIndex(css_attributes['equal_or_startswith_and_next_is_dash'])
+    startswith = PrefixIndex(css_attributes['startswith'])
+    endswith = SuffixIndex(css_attributes['endswith'])
+    contains = AhoCorasick(css_attributes['contains'])
+    attrs_to_delete = set()
     for attr in xhtml_attribute_names:
         unescaped_attr = html.unescape(attr)  # css attributes are already unescaped
-        to_delete = True
-        if unescaped_attr in css_attributes['equal']:
-            to_delete = False
-        if to_delete:
-            for css_attr in css_attributes['equal_or_startswith_and_next_is_dash']:
-                if unescaped_attr == css_attr \
-                        or (unescaped_attr.startswith(css_attr)
-                            and unescaped_attr[len(css_attr):].startswith('-')):
-                    to_delete = False
-                    break
-        if to_delete:
-            for css_attr in css_attributes['startswith']:
-                if unescaped_attr.startswith(css_attr):
-                    to_delete = False
-                    break
-        if to_delete:
-            for css_attr in css_attributes['endswith']:
-                if unescaped_attr.endswith(css_attr):
-                    to_delete = False
-                    break
-        if to_delete:
-            for css_attr in css_attributes['contains']:
-                if css_attr in unescaped_attr:
-                    to_delete = False
-                    break
-        if not to_delete:
-            attrs_to_delete.discard(attr)
+        if not (
+                unescaped_attr in equal
+                or dash.match_dash(unescaped_attr)
+                or startswith.match(unescaped_attr)
+                or endswith.match(unescaped_attr)
+                or contains.search(unescaped_attr)
+        ):
+            attrs_to_delete.add(attr)
     return attrs_to_delete
 
 
-def find_attributes_to_delete(bk, prefs) -> dict:
+def find_attributes_to_delete(bk, prefs, progress: Progress = None) -> dict:
+    """
+    Return the classes and ids of the xhtml files that are not referenced
+    by stylesheets nor by other files. If progress is given, it's told about
+    the 'css', 'xhtml' and 'xml' phases, and the search raises Cancelled
+    (between two files) if progress is cancelled or runs out of time.
+    """
+    # start counting hits and misses of the decoded fragment identifiers from scratch
+    decode_fragid.cache_clear()
+    if prefs.get('use_cache', False):
+        cache_dir = utils.SCRIPT_DIR / 'cache'
+        css_cache = ExtractionCache(cache_dir / 'css.sqlite')
+        xhtml_cache = ExtractionCache(cache_dir / 'xhtml.sqlite')
+        # caches of previous versions, loaded and written as a whole
+        for name in ('css.json', 'xhtml.json'):
+            try:
+                (cache_dir / name).unlink(missing_ok=True)
+            except OSError:
+                pass
+    else:
+        css_cache = xhtml_cache = None
     # search for classes and ids in css
-    my_cssparser = CSSParser()
-    css_attrs = my_cssparser.parse_css(bk)
-    # search for classes, ids and fragment identifiers in xhtml
-    xhtml_attrs = parse_xhtml(bk, my_cssparser, css_attrs, prefs)
+    my_cssparser = CSSParser(engine=prefs.get('css_engine', 'css_parser'))
+    css_attrs = my_cssparser.parse_css(
+        bk, cache=css_cache, max_workers=prefs.get('parallel_workers', 0), progress=progress
+    )
+    if css_cache is not None:
+        css_cache.save()
+    # search for classes, ids and fragment identifiers in xhtml,
+    # keeping the parsed trees around for delete_xhtml_attributes
+    # (if they can be written back)
+    if (
+            prefs.get('rewrite_engine', 'dom') == 'dom'
+            and can_serialize(prefs.get('parser_backend', GumboBackend.name))
+    ):
+        documents = DocumentCache(prefs.get('document_cache_mb', 64) * 1024 * 1024)
+    else:
+        documents = None
+    xhtml_attrs = parse_xhtml(bk, my_cssparser, css_attrs, prefs, documents, xhtml_cache, progress)
+    if xhtml_cache is not None:
+        xhtml_cache.save()
     # search for fragment identifiers also in xml files (ncx, media overlays...)
-    xhtml_attrs = parse_xml(bk, xhtml_attrs, prefs)
+    xhtml_attrs = parse_xml(bk, xhtml_attrs, prefs, progress)
 
     classes_to_delete = xhtml_attrs.class_names.copy()
     for class_ in xhtml_attrs.class_names:
@@ -510,37 +1172,214 @@ def find_attributes_to_delete(bk, prefs) -> dict:
         'classes': classes_to_delete,
         'ids': ids_to_delete,
         'info_classes': xhtml_attrs.info_class_names,
-        'info_ids': xhtml_attrs.info_id_values
+        'info_ids': xhtml_attrs.info_id_values,
+        'documents': documents
     }
 
 
-def delete_xhtml_attributes(bk, attributes: dict, prefs: MutableMapping) -> None:
-    for xhtml_id, xhtml_href in bk.text_iter():
-        if prefs['parse_only_selected_files'] and xhtml_href not in prefs['selected_files']:
+def deletion_plan(attributes: dict):
+    """
+    Invert the occurrences in attributes['info_classes'] and attributes['info_ids']
+    into a dictionary href: {'classes': set(), 'ids': set()} with the classes
+    and ids to remove from each file.
+    Return None if the occurrences are not available.
+    """
+    try:
+        info = {'classes': attributes['info_classes'], 'ids': attributes['info_ids']}
+    except KeyError:
+        return None
+    plan = {}
+    for attr_type in ('classes', 'ids'):
+        for attr in attributes[attr_type]:
+            for href in info[attr_type].get(attr, {}):
+                plan.setdefault(href, {'classes': set(), 'ids': set()})[attr_type].add(attr)
+    return plan
+
+
+def remove_attributes_from_tree(
+        document,
+        classes_to_delete,
+        ids_to_delete,
+        backend: RewriteBackend = None
+) -> bool:
+    """
+    Remove classes and ids from a xhtml file parsed by backend
+    (by default, gumbo). Empty class attributes are removed too.
+    Return True if the tree has been modified.
+    """
+    if backend is None:
+        backend = GumboBackend()
+    modified = False
+    for elem in backend.iter_elements(document):
+        attributes = backend.attributes(elem)
+        if attributes.get('id') in ids_to_delete:
+            backend.delete_attribute(elem, 'id')
+            modified = True
+        if 'class' not in attributes:
             continue
-        soup = gumbo_bs4.parse(bk.readfile(xhtml_id))
-        for elem in soup.find_all(True):
-            try:
-                if elem['id'] in attributes['ids']:
-                    del elem['id']
-            except KeyError:
-                pass
-            classes = elem.get('class', [])
-            if isinstance(classes, str):
-                classes = [classes]
-            for class_ in classes.copy():
-                if class_ in attributes['classes']:
-                    try:
-                        elem['class'].remove(class_)
-                    except AttributeError:
-                        del elem['class']  # this should never raise a KeyError
-            # I don't know if it's linked to python, sigil, beautifulsoup or gumbo versions:
-            # with some installation the elements keep empty class attributes.
-            try:
-                if not classes:
-                    del elem['class']
-            except KeyError:
-                pass
-        bk.writefile(xhtml_id, soup.serialize_xhtml())
-        # print(f"\n\nNew {xhtml_href}:\n")
-        # print(soup.serialize_xhtml())
+        classes = backend.classes(elem)
+        kept = [class_ for class_ in classes if class_ not in classes_to_delete]
+        # I don't know if it's linked to python, sigil, beautifulsoup or gumbo versions:
+        # with some installation the elements keep empty class attributes.
+        if not kept:
+            backend.delete_attribute(elem, 'class')
+            modified = True
+        elif len(kept) < len(classes):
+            backend.set_attribute(elem, 'class', ' '.join(kept))
+            modified = True
+    return modified
+
+
+def _spliced_class_value(attr, classes_to_delete):
+    """
+    Return the new value of the class attribute attr without the classes
+    in classes_to_delete, quoted if needed: '' if no class is left,
+    None if there is nothing to delete.
+    """
+    classes = [class_ for class_ in re.split(r'[ \r\n\t\f]+', attr.value) if class_]
+    kept = [class_ for class_ in classes if class_ not in classes_to_delete]
+    if not kept:
+        return ''
+    if len(kept) == len(classes):
+        return None
+    raw_classes = [class_ for class_ in re.split(r'[ \r\n\t\f]+', attr.raw_value) if class_]
+    decoded = [html.unescape(raw) if '&' in raw else raw for raw in raw_classes]
+    if all(class_ and not re.search(r'[ \r\n\t\f]', class_) for class_ in decoded):
+        # every raw token is a single class: keep character references as they were written
+        value = ' '.join(raw for raw, class_ in zip(raw_classes, decoded) if class_ not in classes_to_delete)
+    else:
+        value = html.escape(' '.join(kept))
+    if attr.value_end == attr.end:  # unquoted value
+        value = '"{}"'.format(value.replace('"', '&quot;'))
+    return value
+
+
+def splice_xhtml_attributes(text: str, classes_to_delete, ids_to_delete) -> tuple:
+    """
+    Remove classes and ids from the source of a xhtml file, editing only
+    the ranges of the class and id attributes involved: the rest of the markup
+    is left as it is. Empty class attributes are removed too, and so are
+    the duplicates (ignored by parsers) of the attributes edited.
+    Return the new text and whether it differs from the original.
+    """
+    pieces = []
+    pos = 0
+    modified = False
+    # The whitespace after an unquoted value, when the attributes that follow
+    # are removed: it's put back only before a name or a slash
+    # (<p id=a/> would make "a/" the id).
+    space = ''
+    unquoted_end = -1  # end of the last unquoted value that is kept
+
+    def copy_to(end):
+        nonlocal space
+        if end > pos:
+            if space and text[pos] not in ' \t\r\n\f>':
+                pieces.append(space)
+            space = ''
+            pieces.append(text[pos:end])
+
+    for tag in markupscanner.iter_start_tags(text):
+        # (attribute, new value): None keeps the attribute, '' removes it
+        edits = []
+        for attr in tag.attributes:
+            value = None
+            if attr.name == 'id':
+                if attr.value in ids_to_delete:
+                    value = ''
+            elif attr.name == 'class':
+                value = _spliced_class_value(attr, classes_to_delete)
+            edits.append((attr, value))
+            # once the first occurrence is edited, a duplicate would become live
+            edits.extend((duplicate, None if value is None else '') for duplicate in attr.duplicates)
+        if len(edits) > len(tag.attributes):
+            edits.sort(key=lambda edit: edit[0].start)
+        for attr, value in edits:
+            if value == '':
+                copy_to(attr.space_start)
+                if attr.space_start == unquoted_end:
+                    space = text[attr.space_start]
+                pos = attr.end
+                modified = True
+            elif value is not None:
+                copy_to(attr.value_start)
+                pieces.append(value)
+                pos = attr.value_end
+                modified = True
+            elif attr.value_start < attr.value_end == attr.end:
+                unquoted_end = attr.end
+    if not modified:
+        return text, False
+    copy_to(len(text))
+    return ''.join(pieces), True
+
+
+def delete_xhtml_attributes(bk, attributes: dict, prefs: MutableMapping, progress: Progress = None) -> dict:
+    """
+    Remove from the xhtml files the classes and ids in attributes['classes']
+    and attributes['ids']. If the occurrences of classes and ids
+    gathered by find_attributes_to_delete are available, only the files
+    that contain them are opened.
+
+    With prefs['rewrite_engine'] == 'splice', only the class and id attributes
+    are edited in the source of the files. Otherwise the files are parsed
+    and serialized again: the trees parsed by find_attributes_to_delete
+    and still available in attributes['documents'] are reused.
+    Backends that can't write their trees back (lxml) are replaced by gumbo.
+
+    Only files that actually changed are written back: return the number
+    of files written and of files skipped.
+
+    If progress is given, the files are reported to it as the 'delete' phase,
+    counting the bytes written back. If progress is cancelled, Cancelled
+    is raised between two files: the files already written stay modified.
+    """
+    documents = attributes.get('documents')
+    splice = prefs.get('rewrite_engine', 'dom') == 'splice'
+    backend = get_backend(prefs.get('parser_backend', GumboBackend.name))
+    if not splice and not isinstance(backend, RewriteBackend):
+        backend = GumboBackend()
+        if documents is not None:
+            # trees of the other backend
+            documents.clear()
+            documents = None
+    plan = deletion_plan(attributes)
+    written = skipped = 0
+    files = [
+        (xhtml_id, xhtml_href) for xhtml_id, xhtml_href in bk.text_iter()
+        if not prefs['parse_only_selected_files'] or xhtml_href in prefs['selected_files']
+    ]
+    if progress is not None:
+        progress.start_phase('delete', len(files))
+    for xhtml_id, xhtml_href in files:
+        if progress is not None:
+            progress.start_file(xhtml_href)
+        if plan is None:
+            classes_to_delete, ids_to_delete = attributes['classes'], attributes['ids']
+        elif xhtml_href in plan:
+            classes_to_delete, ids_to_delete = plan[xhtml_href]['classes'], plan[xhtml_href]['ids']
+        else:
+            skipped += 1
+            if progress is not None:
+                progress.file_done(xhtml_href)
+            continue
+        if splice:
+            text, modified = splice_xhtml_attributes(bk.readfile(xhtml_id), classes_to_delete, ids_to_delete)
+        else:
+            document = documents.pop(xhtml_id) if documents is not None else None
+            if document is None:
+                document = backend.parse(bk.readfile(xhtml_id))
+            modified = remove_attributes_from_tree(document, classes_to_delete, ids_to_delete, backend)
+            text = backend.serialize(document) if modified else None
+        if modified:
+            bk.writefile(xhtml_id, text)
+            written += 1
+        else:
+            skipped += 1
+        if progress is not None:
+            progress.file_done(xhtml_href, text_size(text) if modified else 0)
+    if progress is not None:
+        progress.end_phase()
+    if documents is not None:
+        documents.clear()
+    return {'written': written, 'skipped': skipped}
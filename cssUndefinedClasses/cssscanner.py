@@ -0,0 +1,419 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# Copyright (c) 2026 Francesco Martini
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Selector-only scanner of css stylesheets.
+
+It tokenizes a stylesheet following (a simplified version of) the rules
+of CSS Syntax Module Level 3 and yields the text of every selector
+of the style rules, without building an object model: declaration blocks
+are skipped, conditional group rules (@media, @supports, @layer...)
+are descended into, other at-rules are skipped. Nested style rules
+found in declaration blocks (css nesting) are reported too.
+
+Malformed input raises CSSScanError: missing or unexpected braces,
+selectors that don't follow the selector grammar (empty names after
+'.' or '#', invalid identifiers, consecutive combinators...) and
+declarations without a property name or a value. Unlike css_parser,
+the scanner accepts css nesting and empty custom properties, and doesn't
+look into the blocks of the at-rules it skips (@font-face, @page...).
+"""
+
+import regex as re
+
+
+# At-rules whose block contains rules (or declarations, when nested).
+GROUP_RULES = frozenset((
+    'media', 'supports', 'layer', 'container', 'document', '-moz-document'
+))
+
+
+class CSSScanError(Exception):
+    pass
+
+
+_token = re.compile(
+    r'''
+    (?P<comment>/\*.*?(?:\*/|\Z))
+    |(?P<string>"(?:[^"\\\n]|\\.|\\\Z)*(?:"|(?=\n)|\Z)|'(?:[^'\\\n]|\\.|\\\Z)*(?:'|(?=\n)|\Z))
+    |(?P<atkeyword>@(?:[\w-]|\\.)*)
+    |(?P<cdx><!--|-->)
+    |(?P<url>[uU][rR][lL]\([ \t\r\n\f]*(?=[^"' \t\r\n\f])(?:[^)\\]|\\.|\\\Z)*(?:\)|\Z))  # unquoted url
+    |(?P<char>[{}()\[\];,])
+    |(?P<other>(?:
+        [^{}()\[\];,"'/\\@<\-uU]
+        |\\.|\\\Z
+        |/(?!\*)|<(?!!--)|-(?!->)
+        |[uU](?![rR][lL]\([ \t\r\n\f]*[^"' \t\r\n\f])
+    )+)
+    ''',
+    re.VERBOSE | re.DOTALL
+)
+_escape = re.compile(r'\\(?:([0-9a-fA-F]{1,6})[ \t\r\n\f]?|(.))', re.DOTALL)
+_ident_char = re.compile(r'[a-zA-Z0-9_-]|[^\x00-\x7f]')
+# Escapes (left untouched), operators with their surrounding whitespace
+# and other runs of whitespace inside attribute selectors.
+_attribute_space = re.compile(
+    r'(\\(?:[0-9a-fA-F]{1,6}[ \t\r\n\f]?|.))|[ \t\r\n\f]*([~|^$*]?=)[ \t\r\n\f]*|([ \t\r\n\f]+)',
+    re.DOTALL
+)
+_closing = {'(': ')', '[': ']', '{': '}'}
+
+# Building blocks of the selector and declaration grammars.
+_css_escape = r'\\(?:[0-9a-fA-F]{1,6}[ \t\r\n\f]?|[^\r\n\f0-9a-fA-F])'
+_nmchar = r'(?:[a-zA-Z0-9_-]|[^\x00-\x7f]|' + _css_escape + ')'
+_ident = r'(?:--|-?(?:[a-zA-Z_]|[^\x00-\x7f]|' + _css_escape + '))' + _nmchar + '*'
+_quoted = r'''(?:"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')'''
+_ws = r'[ \t\r\n\f]*'
+_selector_token = re.compile(
+    r'''
+    (?P<space>[ \t\r\n\f]+)
+    |(?P<combinator>[>+~])
+    |(?P<type>(?:(?:IDENT|\*)?\|)?(?:IDENT|\*))
+    |(?P<subclass>
+        \.IDENT
+        |\#NMCHAR+
+        |&
+        |\[WS(?:(?:IDENT|\*)?\|)?IDENTWS(?:[~|^$*]?=WS(?:IDENT|QUOTED)WS(?:[iIsS]WS)?)?\]
+        |::?(?P<pseudo>IDENT)(?P<function>\()?
+    )
+    '''.replace('IDENT', _ident).replace('NMCHAR', _nmchar).replace('QUOTED', _quoted).replace('WS', _ws),
+    re.VERBOSE | re.DOTALL
+)
+# Parentheses, brackets and commas outside of strings and escapes.
+_selector_structure = re.compile(r'''\\.|"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|[()\[\],]''', re.DOTALL)
+_declaration = re.compile(_ws + '(' + _ident + ')' + _ws + ':(.*)', re.DOTALL)
+_priority = re.compile(r'!' + _ws + r'important' + _ws + r'\Z', re.IGNORECASE)
+# Functional pseudo-classes whose argument is a list of selectors.
+_SELECTOR_FUNCTIONS = frozenset(('not', 'is', 'where', 'has', 'matches', '-moz-any', '-webkit-any'))
+
+
+def _resolve_escape(escape) -> str:
+    if escape.group(1) is None:
+        return escape.group()
+    code_point = int(escape.group(1), 16)
+    if code_point == 0 or 0xD800 <= code_point <= 0xDFFF or code_point > 0x10FFFF:
+        return '�'
+    char = chr(code_point)
+    # characters that are not part of identifiers stay escaped
+    return char if _ident_char.match(char) else '\\' + char
+
+
+def resolve_escapes(selector: str) -> str:
+    """
+    Resolve the unicode escape sequences in selector.
+    Resolved characters with a meaning in selectors are escaped again
+    with a single backslash (as other escaped characters).
+    """
+    if '\\' not in selector:
+        return selector
+    return _escape.sub(_resolve_escape, selector)
+
+
+def _compact_attribute_text(text: str) -> tuple:
+    """
+    Remove the whitespace around the operators of an attribute selector
+    and collapse other runs of whitespace in text, a token inside brackets.
+    Return the compacted text, without its leading and trailing whitespace,
+    and two booleans telling if it had leading and trailing whitespace.
+    """
+    pieces = []
+    leading = trailing = False
+    position = 0
+    for match in _attribute_space.finditer(text):
+        pieces.append(text[position:match.start()])
+        position = match.end()
+        if match.group(3) is None:
+            pieces.append(match.group(1) or match.group(2))
+        elif match.start() == 0:
+            leading = True
+        elif match.end() == len(text):
+            trailing = True
+        else:
+            pieces.append(' ')
+    pieces.append(text[position:])
+    return ''.join(pieces), leading, trailing
+
+
+def _split_arguments(text: str, start: int) -> tuple:
+    """
+    Split text from start to the closing parenthesis of the function
+    whose argument starts there, on the commas outside of parentheses
+    and brackets. Return the arguments and the index after the parenthesis
+    (-1 if it's missing).
+    """
+    arguments = []
+    depth = 0
+    for token in _selector_structure.finditer(text, start):
+        char = token.group()
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            if depth == 0:
+                arguments.append(text[start:token.start()])
+                return arguments, token.end()
+            depth -= 1
+        elif char == ',' and depth == 0:
+            arguments.append(text[start:token.start()])
+            start = token.end()
+    return arguments, -1
+
+
+def check_selector(selector: str, relative: bool = False) -> str:
+    """
+    Check that selector (with unicode escapes not resolved yet) is a valid
+    complex selector and return the description of the first error found,
+    or an empty string. If relative, the selector can start with
+    a combinator (nested rules, :has()).
+    """
+    i = 0
+    last = ''  # 'combinator' or 'simple'
+    space = False
+    while i < len(selector):
+        token = _selector_token.match(selector, i)
+        if not token:
+            return 'Unexpected {!r}'.format(selector[i])
+        i = token.end()
+        if token.group('space') is not None:
+            space = True
+            continue
+        if token.group('combinator') is not None:
+            if last == 'combinator' or (not last and not relative):
+                return 'Unexpected combinator {!r}'.format(token.group())
+            last = 'combinator'
+            space = False
+            continue
+        if token.group('type') is not None and last == 'simple' and not space:
+            return 'Unexpected type selector {!r}'.format(token.group())
+        if token.group('function') is not None:
+            arguments, i = _split_arguments(selector, i)
+            if i == -1:
+                return 'Missing ")"'
+            if token.group('pseudo').lower() in _SELECTOR_FUNCTIONS:
+                for argument in arguments:
+                    error = check_selector(argument, token.group('pseudo').lower() == 'has')
+                    if error:
+                        return error
+        last = 'simple'
+        space = False
+    if last == 'combinator':
+        return 'Cannot end with a combinator'
+    if not last:
+        return 'Empty selector'
+    return ''
+
+
+class _Scanner:
+
+    def __init__(self, css_text: str) -> None:
+        self.text = css_text
+        self.tokens = list(_token.finditer(css_text))
+        self.selectors = []
+
+    def error(self, message: str, index: int) -> CSSScanError:
+        pos = self.tokens[index].start() if index < len(self.tokens) else len(self.text)
+        line = self.text.count('\n', 0, pos) + 1
+        column = pos - self.text.rfind('\n', 0, pos)
+        return CSSScanError('{} [{}:{}]'.format(message, line, column))
+
+    def is_blank(self, token) -> bool:
+        kind = token.lastgroup
+        return kind == 'comment' or (kind == 'other' and token.group().isspace())
+
+    def rule_list(self, i: int, nested: bool) -> int:
+        """
+        Scan a list of rules, at top level or inside the block of
+        a group rule, and return the index after its end.
+        """
+        tokens = self.tokens
+        while i < len(tokens):
+            token = tokens[i]
+            kind = token.lastgroup
+            if self.is_blank(token) or (kind == 'cdx' and not nested):
+                i += 1
+            elif kind == 'char' and token.group() == '}':
+                if nested:
+                    return i + 1
+                raise self.error("Unexpected '}'", i)
+            elif kind == 'atkeyword':
+                i = self.at_rule(i, declarations=False)
+            else:
+                i = self.qualified_rule(i, strict=True)
+        return i
+
+    def declaration_list(self, i: int) -> int:
+        """
+        Skip the declarations in a block, reporting the selectors
+        of nested rules, and return the index after its end.
+        """
+        tokens = self.tokens
+        while i < len(tokens):
+            token = tokens[i]
+            kind = token.lastgroup
+            if self.is_blank(token):
+                i += 1
+            elif kind == 'char' and token.group() == '}':
+                return i + 1
+            elif kind == 'char' and token.group() == ';':
+                i += 1
+            elif kind == 'atkeyword':
+                i = self.at_rule(i, declarations=True)
+            else:
+                start = i
+                i, end = self.prelude(i, (';', '{', '}'))
+                if end == '{':
+                    self.add_selectors(start, i, strict=False)
+                    i = self.declaration_list(i + 1)
+                else:
+                    self.check_declaration(start, i)
+        return i
+
+    def check_declaration(self, start: int, end: int) -> None:
+        """
+        Raise an error if tokens[start:end] are not a declaration
+        with a value (custom properties can be empty).
+        """
+        text = ''.join(token.group() for token in self.tokens[start:end] if token.lastgroup != 'comment')
+        declaration = _declaration.match(text)
+        if not declaration:
+            raise self.error('Invalid declaration: {!r}'.format(text.strip()), start)
+        value = _priority.sub('', declaration.group(2)).strip(' \t\r\n\f')
+        if not value and not declaration.group(1).startswith('--'):
+            raise self.error('No property value found: {!r}'.format(text.strip()), start)
+
+    def prelude(self, i: int, stop: tuple) -> tuple:
+        """
+        Advance to the first of the chars in stop outside of
+        parentheses and brackets. Return its index (the length
+        of the tokens at the end of the stylesheet) and the char.
+        """
+        tokens = self.tokens
+        closing = []
+        while i < len(tokens):
+            token = tokens[i]
+            if token.lastgroup == 'char':
+                char = token.group()
+                if closing:
+                    if char == closing[-1]:
+                        closing.pop()
+                    elif char in _closing:
+                        closing.append(_closing[char])
+                elif char in stop:
+                    return i, char
+                elif char in _closing:
+                    closing.append(_closing[char])
+            i += 1
+        return i, ''
+
+    def skip_block(self, i: int) -> int:
+        """
+        Skip the block opened at index i and return the index after its end.
+        """
+        i, end = self.prelude(i + 1, ('}',))
+        return i + 1
+
+    def at_rule(self, i: int, declarations: bool) -> int:
+        name = self.tokens[i].group()[1:].lower()
+        i, end = self.prelude(i + 1, (';', '{', '}'))
+        if end == ';':
+            return i + 1
+        if end == '{':
+            if name in GROUP_RULES:
+                if declarations:
+                    return self.declaration_list(i + 1)
+                return self.rule_list(i + 1, nested=True)
+            return self.skip_block(i)
+        # '}' closes the enclosing block, or the end of the stylesheet
+        return i
+
+    def qualified_rule(self, i: int, strict: bool) -> int:
+        start = i
+        i, end = self.prelude(i, ('{', '}', ';'))
+        if end != '{':
+            raise self.error('No start {{ of style declaration found: {!r}'.format(
+                self.text[self.tokens[start].start():self.tokens[i].end() if end else len(self.text)]
+            ), i)
+        self.add_selectors(start, i, strict)
+        return self.declaration_list(i + 1)
+
+    def add_selectors(self, start: int, end: int, strict: bool) -> None:
+        """
+        Split the prelude in tokens[start:end] on commas outside of
+        parentheses and brackets, and add the selectors to self.selectors.
+        Whitespace inside attribute selectors is normalized as in the
+        selectorText of css_parser ([ class = "x" ] -> [class="x"]).
+        If strict, empty selectors raise an error.
+        """
+        selectors = []
+        pieces = []
+        depth = 0
+        brackets = 0
+        space = False
+        for token in self.tokens[start:end]:
+            kind = token.lastgroup
+            if kind == 'comment':
+                continue
+            text = token.group()
+            if brackets and kind == 'other':
+                text, leading, trailing = _compact_attribute_text(text)
+                space = space or leading
+                if text:
+                    if space and pieces[-1] != '[':
+                        pieces.append(' ')
+                    pieces.append(text)
+                    space = trailing
+                continue
+            if kind == 'char':
+                if text in '([':
+                    depth += 1
+                elif text in ')]':
+                    depth -= 1
+                elif text == ',' and depth == 0:
+                    selectors.append(''.join(pieces).strip())
+                    pieces.clear()
+                    continue
+                if text == '[':
+                    brackets += 1
+                elif text == ']' and brackets:
+                    brackets -= 1
+                    space = False
+            if space:
+                pieces.append(' ')
+                space = False
+            pieces.append(text)
+        selectors.append(''.join(pieces).strip())
+        for selector in selectors:
+            if selector:
+                error = check_selector(selector, relative=not strict)
+                if error:
+                    raise self.error('Invalid selector {!r}: {}'.format(selector, error), start)
+                self.selectors.append(resolve_escapes(selector))
+            elif strict:
+                raise self.error('Invalid or incomplete selector', start)
+
+
+def iter_selectors(css_text: str):
+    """
+    Yield the text of the selectors of all the style rules in css_text,
+    with unicode escape sequences resolved.
+    """
+    scanner = _Scanner(css_text)
+    scanner.rule_list(0, nested=False)
+    yield from scanner.selectors
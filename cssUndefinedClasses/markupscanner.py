@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# Copyright (c) 2026 Francesco Martini
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Lightweight scanner of the start tags of (x)html documents, that reports
+the position of every tag and attribute in the source text.
+
+It follows the tokenization rules of the HTML5 standard for tags,
+attributes, comments and raw text elements, but doesn't build any tree:
+it's meant for tasks that need only the attributes of the elements,
+or to edit the source text without re-serializing the whole document.
+"""
+
+import html
+import functools
+from typing import NamedTuple
+
+import regex as re
+
+
+# Elements whose content is text (no tags are recognized inside them).
+RAW_TEXT_ELEMENTS = frozenset((
+    'style', 'script', 'textarea', 'title', 'xmp', 'iframe', 'noembed', 'noframes'
+))
+
+
+class Attribute(NamedTuple):
+    name: str  # lowercase name
+    value: str  # value with character references resolved
+    raw_value: str  # value as written in the source
+    space_start: int  # start of the whitespace before the attribute name
+    start: int  # start of the attribute name
+    end: int  # end of the attribute (after the closing quote, if present)
+    value_start: int  # start of the value (after the opening quote, if present)
+    value_end: int  # end of the value (before the closing quote, if present)
+    duplicates: tuple = ()  # later occurrences of the attribute, ignored by parsers
+
+
+class StartTag(NamedTuple):
+    name: str  # lowercase name
+    start: int
+    end: int
+    attributes: list  # first occurrence of every attribute, in source order (see Attribute.duplicates)
+    self_closing: bool
+    content: str = None  # text content of raw text elements
+
+
+_markup = re.compile(
+    r'''
+    <!--.*?(?:-->|\Z)               # comment
+    |<!\[CDATA\[.*?(?:\]\]>|\Z)     # cdata section
+    |<[!?][^>]*(?:>|\Z)             # doctype, processing instruction, bogus comment
+    |</[^>]*(?:>|\Z)                # end tag
+    |<([a-zA-Z][^\s/>]*)            # start tag
+    ''',
+    re.VERBOSE | re.DOTALL
+)
+_tag_end = re.compile(r'[\s/]*?(/?)>')
+_attribute = re.compile(
+    r'''
+    ([\s/]*)
+    ([^\s/>][^\s/>=]*)
+    (?:
+        \s*=\s*
+        (?:"([^"]*)"|'([^']*)'|([^\s>]+))
+    )?
+    ''',
+    re.VERBOSE
+)
+_raw_text_end = {
+    name: re.compile(r'</' + name + r'[\s/>]', re.IGNORECASE) for name in RAW_TEXT_ELEMENTS
+}
+
+
+def iter_start_tags(text: str):
+    """
+    Yield a StartTag for every start tag in text, in source order.
+    """
+    pos = 0
+    while True:
+        markup = _markup.search(text, pos)
+        if not markup:
+            return
+        pos = markup.end()
+        if not markup.group(1):
+            continue
+        tag_name = markup.group(1).lower()
+        attributes = []
+        first = {}  # name: index in attributes
+        duplicates = {}  # name: list of later occurrences
+        while True:
+            end = _tag_end.match(text, pos)
+            if end:
+                break
+            attr = _attribute.match(text, pos)
+            if not attr:
+                # unterminated tag at the end of the document: html5 drops it
+                return
+            pos = attr.end()
+            name = attr.group(2).lower()
+            for group in (3, 4, 5):
+                if attr.start(group) != -1:
+                    raw_value = attr.group(group)
+                    value_start, value_end = attr.span(group)
+                    break
+            else:
+                raw_value = ''
+                value_start = value_end = attr.end()
+            attribute = Attribute(
+                name,
+                html.unescape(raw_value) if '&' in raw_value else raw_value,
+                raw_value,
+                attr.start(1),
+                attr.start(2),
+                attr.end(),
+                value_start,
+                value_end
+            )
+            if name in first:
+                # duplicate attributes are ignored
+                duplicates.setdefault(name, []).append(attribute)
+                continue
+            first[name] = len(attributes)
+            attributes.append(attribute)
+        for name, occurrences in duplicates.items():
+            index = first[name]
+            attributes[index] = attributes[index]._replace(duplicates=tuple(occurrences))
+        pos = end.end()
+        self_closing = bool(end.group(1))
+        content = None
+        if tag_name in RAW_TEXT_ELEMENTS and not self_closing:
+            close = _raw_text_end[tag_name].search(text, pos)
+            content_end = close.start() if close else len(text)
+            content = text[pos:content_end]
+            pos = content_end
+        yield StartTag(tag_name, markup.start(), end.end(), attributes, self_closing, content)
+
+
+@functools.lru_cache(maxsize=16)
+def _attribute_values_pattern(names: frozenset) -> re.Pattern:
+    alternatives = '|'.join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+    return re.compile(
+        r'''
+        (?<=[\s"'/])({})
+        \s*=\s*
+        (?:"([^"]*)"|'([^']*)'|([^\s>]+))
+        '''.format(alternatives),
+        re.VERBOSE | re.IGNORECASE
+    )
+
+
+def iter_attribute_values(text: str, names):
+    """
+    Yield (name, value) for every attribute in text whose lowercase name
+    is in names, with character references in value resolved.
+
+    Much faster than iter_start_tags, since text is searched only
+    for the attributes in names, but it doesn't tell markup from text:
+    attribute-like strings in comments, raw text elements or in the text
+    of the document are reported too, as well as duplicate attributes.
+    Use it only when a few spurious values are harmless.
+    """
+    for attr in _attribute_values_pattern(frozenset(names)).finditer(text):
+        raw_value = attr.group(2)
+        if raw_value is None:
+            raw_value = attr.group(3) if attr.group(3) is not None else attr.group(4)
+        yield attr.group(1).lower(), html.unescape(raw_value) if '&' in raw_value else raw_value
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# Copyright (c) 2026 Francesco Martini
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Multi-pattern string matchers used to compare class and id values
+with the values of css attribute selectors.
+"""
+
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton that tells whether a text contains
+    at least one of a set of patterns, in time linear in the length
+    of the text (independently of the number of patterns).
+    """
+
+    def __init__(self, patterns) -> None:
+        # state 0 is the root; for each state: transitions, failure link
+        # and whether a pattern ends in it (or in one of its suffixes)
+        self._goto = [{}]
+        self._fail = [0]
+        self._terminal = [False]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build_failure_links()
+
+    def _add(self, pattern: str) -> None:
+        state = 0
+        for char in pattern:
+            try:
+                state = self._goto[state][char]
+            except KeyError:
+                self._goto.append({})
+                self._fail.append(0)
+                self._terminal.append(False)
+                self._goto[state][char] = len(self._goto) - 1
+                state = len(self._goto) - 1
+        self._terminal[state] = True
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                if self._terminal[self._fail[next_state]]:
+                    self._terminal[next_state] = True
+
+    def search(self, text: str) -> bool:
+        """
+        True if any of the patterns occurs in text.
+        """
+        goto, fail, terminal = self._goto, self._fail, self._terminal
+        if terminal[0]:  # the empty string is one of the patterns
+            return True
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if terminal[state]:
+                return True
+        return False
+
+
+class PrefixIndex:
+    """
+    Trie of patterns that tells whether one of them
+    is a prefix of a text, in time linear in the length of the text.
+    """
+
+    _end = ''  # key of the nodes where a pattern ends (it's never a character)
+
+    def __init__(self, patterns) -> None:
+        self._root = {}
+        for pattern in patterns:
+            node = self._root
+            for char in self._chars(pattern):
+                node = node.setdefault(char, {})
+            node[self._end] = True
+
+    @staticmethod
+    def _chars(text: str):
+        return text
+
+    def match(self, text: str) -> bool:
+        """
+        True if text starts with any of the patterns.
+        """
+        node = self._root
+        if self._end in node:
+            return True
+        for char in self._chars(text):
+            try:
+                node = node[char]
+            except KeyError:
+                return False
+            if self._end in node:
+                return True
+        return False
+
+    def match_dash(self, text: str) -> bool:
+        """
+        True if text is equal to any of the patterns, or starts with one of them
+        immediately followed by '-' (the rule of the |= attribute selector).
+        """
+        node = self._root
+        for char in self._chars(text):
+            if self._end in node and char == '-':
+                return True
+            try:
+                node = node[char]
+            except KeyError:
+                return False
+        return self._end in node
+
+
+class SuffixIndex(PrefixIndex):
+    """
+    Trie of reversed patterns that tells whether one of them
+    is a suffix of a text, in time linear in the length of the text.
+    """
+
+    @staticmethod
+    def _chars(text: str):
+        return text[::-1]
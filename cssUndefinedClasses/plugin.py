@@ -41,6 +41,14 @@ def get_prefs(bk):
     prefs.defaults['tktheme'] = 'clearlooks'
     prefs.defaults['update_prefs_defaults'] = 0
     prefs.defaults['quiet'] = False
+    prefs.defaults['document_cache_mb'] = 64  # memory for parsed xhtml kept between search and deletion
+    prefs.defaults['use_cache'] = True  # values extracted from unchanged files are read from the cache dir
+    prefs.defaults['xhtml_extractor'] = 'tree'  # 'tree' parses xhtml with parser_backend, 'stream' only scans start tags
+    prefs.defaults['parser_backend'] = 'gumbo'  # 'gumbo' (sigil's parser) or 'lxml' (libxml2, search only)
+    prefs.defaults['rewrite_engine'] = 'dom'  # 'dom' re-serializes files, 'splice' edits only the attributes
+    prefs.defaults['parallel_workers'] = 0  # number of processes parsing xhtml and css files, 0 or 1 to parse serially
+    prefs.defaults['css_engine'] = 'css_parser'  # 'css_parser' validates stylesheets, 'scanner' only reads selectors
+    prefs.defaults['time_budget'] = 0  # seconds after which quiet mode gives up without modifying files, 0 for no limit
 
     if prefs['update_prefs_defaults'] == 0:
         if prefs['fragid_container_attrs']:
@@ -52,17 +60,33 @@ def get_prefs(bk):
     return prefs
 
 
+def print_progress(event, progress):
+    if event == 'phase_done':
+        print('{}: {} files, {} bytes in {:.2f} seconds.'.format(
+            progress.phase, progress.done_files, progress.done_bytes, progress.phase_elapsed
+        ))
+
+
 def run(bk):
     prefs = get_prefs(bk)
     if prefs['quiet']:
         prefs['parse_only_selected_files'] = False
-        attrs = core.find_attributes_to_delete(bk, prefs)
-        core.delete_xhtml_attributes(bk, attrs, prefs)
-        success = True
+        progress = core.Progress(print_progress, prefs['time_budget'])
+        try:
+            attrs = core.find_attributes_to_delete(bk, prefs, progress)
+            written_files = core.delete_xhtml_attributes(bk, attrs, prefs, progress)
+        except core.Cancelled as E:
+            # a non-zero exit status tells Sigil to discard the files already written
+            print(f'{E}: the book has not been modified.')
+            success = False
+        else:
+            print('{written} files modified, {skipped} files unchanged.'.format(**written_files))
+            success = True
     else:
         app = PluginApplication([], bk, app_icon=PLUGIN_ICON, match_dark_palette=iswindows)
         window = ui.MainWindow(bk, prefs)
-        success = not app.exec()
+        # the window may be closed during the deletion, quitting with status 0
+        success = not app.exec() and not window.deletion_interrupted
     return 0 if success else 1
 
 
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# Copyright (c) 2026 Francesco Martini
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Progress reports and cancellation of the long running functions of core.
+"""
+
+import time
+import threading
+
+
+class Cancelled(Exception):
+    """
+    Raised between two files when the task has been cancelled.
+    """
+    pass
+
+
+class TimeBudgetExceeded(Cancelled):
+    """
+    Raised between two files when the task has run out of time.
+    """
+    pass
+
+
+def text_size(data) -> int:
+    """
+    Size in bytes of the content of a file (str are measured as utf-8).
+    """
+    if isinstance(data, str):
+        return len(data.encode('utf-8', 'surrogatepass'))
+    return len(data)
+
+
+class Progress:
+    """
+    Token passed to the functions of core to follow and stop their work.
+
+    Every function runs a phase ('css', 'xhtml', 'xml' or 'delete')
+    made of files. If callback is given, it's called as callback(event, progress),
+    where event is one of 'phase_started', 'file_started', 'file_done'
+    and 'phase_done'. Then the attributes of progress tell the current phase,
+    the current file (href), the files and bytes done, and their totals
+    (total_bytes is None when sizes aren't known before reading the files).
+
+    cancel() can be called from any thread: the running function raises
+    Cancelled before its next file. With a time_budget (in seconds),
+    it raises TimeBudgetExceeded once the budget is spent.
+    The callback can raise Cancelled too.
+    """
+
+    def __init__(self, callback=None, time_budget: float = None) -> None:
+        self.callback = callback
+        self.started = time.monotonic()
+        self.deadline = self.started + time_budget if time_budget else None
+        self._cancel_requested = threading.Event()
+        self.phase = None
+        self.phase_started = None
+        self.href = None
+        self.done_files = self.total_files = 0
+        self.done_bytes = 0
+        self.total_bytes = None
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def phase_elapsed(self) -> float:
+        return time.monotonic() - self.phase_started
+
+    def cancel(self) -> None:
+        self._cancel_requested.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel_requested.is_set()
+
+    def check(self) -> None:
+        """
+        Raise Cancelled if the task has been cancelled or has run out of time.
+        """
+        if self._cancel_requested.is_set():
+            raise Cancelled('Cancelled during the {} phase'.format(self.phase))
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise TimeBudgetExceeded(
+                'Time budget exceeded during the {} phase, after {:.1f} seconds'.format(self.phase, self.elapsed)
+            )
+
+    def _notify(self, event: str) -> None:
+        if self.callback is not None:
+            self.callback(event, self)
+
+    def start_phase(self, phase: str, total_files: int, total_bytes: int = None) -> None:
+        self.check()
+        self.phase = phase
+        self.phase_started = time.monotonic()
+        self.href = None
+        self.done_files = self.done_bytes = 0
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self._notify('phase_started')
+
+    def start_file(self, href: str) -> None:
+        self.check()
+        self.href = href
+        self._notify('file_started')
+
+    def file_done(self, href: str, size: int = 0) -> None:
+        """
+        Count a file as done. Files parsed in a pool of processes
+        are reported only here, as soon as they are done.
+        """
+        self.href = href
+        self.done_files += 1
+        self.done_bytes += size
+        self._notify('file_done')
+
+    def end_phase(self) -> None:
+        self.href = None
+        self._notify('phase_done')
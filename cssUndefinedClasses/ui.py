@@ -21,23 +21,62 @@ import sys
 import regex as re
 
 from plugin_utils import (
-    PluginApplication, QtWidgets, QtCore, Qt, QtGui, iswindows
+    PluginApplication, QtWidgets, QtCore, QtGui, Signal, iswindows
 )
 from wrappingcheckbox import WrappingCheckBox
+from attributesview import AttributesModel, AttributesView
 import core
 import utils
 
 
+class TaskWorker(QtCore.QObject):
+    """
+    Runs function(*args, progress=...) in a QThread, reporting the files
+    done through the progressed signal. A cancelled task stops between two files.
+    """
+
+    progressed = Signal(str, int, int, str)  # phase, files done, total files, current file
+    succeeded = Signal(object)  # return value of function
+    failed = Signal(object)  # exception raised by function
+    cancelled = Signal()
+
+    def __init__(self, function, *args):
+        super().__init__()
+        self.function = function
+        self.args = args
+        self.progress = core.Progress(self.report)
+
+    def cancel(self):
+        self.progress.cancel()
+
+    def report(self, event: str, progress: core.Progress):
+        if event != 'phase_done':
+            self.progressed.emit(progress.phase, progress.done_files, progress.total_files, progress.href or '')
+
+    def run(self):
+        try:
+            result = self.function(*self.args, progress=self.progress)
+        except core.Cancelled:
+            self.cancelled.emit()
+        except Exception as E:
+            self.failed.emit(E)
+        else:
+            self.succeeded.emit(result)
+
+
 class MainWindow(QtWidgets.QWidget):
 
     def __init__(self, bk, prefs, parent=None):
         self.bk = bk
         self.prefs = prefs
         self.undefined_attributes: dict[str, set[str]] = {}
-        self.check_undefined_attributes = {
-            'classes': {},
-            'ids': {},
-        }
+        self.attributes_models: dict[str, AttributesModel] = {}
+        self.task_thread: QtCore.QThread = None
+        self.task_worker: TaskWorker = None
+        self.task_messages = {}
+        self.task_callbacks = (None, None, None)
+        # set when the deletion didn't complete, and Sigil must discard the changes
+        self.deletion_interrupted = False
 
         super().__init__(parent)
         self.setWindowTitle("cssUndefinedClasses")
@@ -52,33 +91,23 @@ class MainWindow(QtWidgets.QWidget):
         self.top_label.setWordWrap(True)
         main_layout.addWidget(self.top_label, 0, 0, 1, -1)
 
-        paned_window = QtWidgets.QSplitter()
+        self.paned_window = paned_window = QtWidgets.QSplitter()
 
-        classes_area = QtWidgets.QScrollArea()
-        classes_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        classes_area.setWidgetResizable(True)
-        classes_area.setContentsMargins(0, 0, 0, 0)
-        self.classes_frame_layout = QtWidgets.QVBoxLayout()
+        # the lists of classes and ids scroll by themselves
+        classes_frame = QtWidgets.QFrame()
+        classes_frame.setFrameShape(QtWidgets.QFrame.StyledPanel)
+        self.classes_frame_layout = QtWidgets.QVBoxLayout(classes_frame)
         self.classes_frame_layout.setSpacing(0)
         self.classes_frame_layout.setContentsMargins(0, 0, 0, 0)
-        classes_frame = QtWidgets.QWidget()
-        classes_frame.setLayout(self.classes_frame_layout)
-        classes_area.setWidget(classes_frame)
-        classes_area.setFocusPolicy(Qt.NoFocus)
-
-        ids_area = QtWidgets.QScrollArea()
-        ids_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        ids_area.setWidgetResizable(True)
-        self.ids_frame_layout = QtWidgets.QVBoxLayout()
+
+        ids_frame = QtWidgets.QFrame()
+        ids_frame.setFrameShape(QtWidgets.QFrame.StyledPanel)
+        self.ids_frame_layout = QtWidgets.QVBoxLayout(ids_frame)
         self.ids_frame_layout.setSpacing(0)
         self.ids_frame_layout.setContentsMargins(0, 0, 0, 0)
-        ids_frame = QtWidgets.QWidget()
-        ids_frame.setLayout(self.ids_frame_layout)
-        ids_area.setWidget(ids_frame)
-        ids_area.setFocusPolicy(Qt.NoFocus)
 
-        paned_window.addWidget(classes_area)
-        paned_window.addWidget(ids_area)
+        paned_window.addWidget(classes_frame)
+        paned_window.addWidget(ids_frame)
 
         main_layout.addWidget(paned_window, 1, 0, 1, -1)
         main_layout.setRowStretch(1, 1)
@@ -89,11 +118,23 @@ class MainWindow(QtWidgets.QWidget):
 
         main_layout.addWidget(self.warning_label, 2, 0, 1, -1)
 
+        # shown only while searching or deleting
+        self.progress_label = QtWidgets.QLabel()
+        self.progress_bar = QtWidgets.QProgressBar()
+        self.progress_bar.setFormat('%v/%m files')
+        progress_layout = QtWidgets.QHBoxLayout()
+        progress_layout.addWidget(self.progress_label, stretch=1)
+        progress_layout.addWidget(self.progress_bar)
+        self.progress_label.hide()
+        self.progress_bar.hide()
+
+        main_layout.addLayout(progress_layout, 3, 0, 1, -1)
+
         self.prefs_button = QtWidgets.QPushButton('Preferences')
         self.prefs_button.clicked.connect(self.prefs_dlg)
         self.prefs_button.setAutoDefault(True)
         self.stop_button = QtWidgets.QPushButton('Cancel')
-        self.stop_button.clicked.connect(lambda: QtWidgets.QApplication.exit(0))
+        self.stop_button.clicked.connect(self.cancel)
         self.stop_button.setAutoDefault(True)
         self.ok_button = QtWidgets.QPushButton('Proceed')
         self.ok_button.clicked.connect(self.start_parsing)
@@ -105,7 +146,7 @@ class MainWindow(QtWidgets.QWidget):
         buttons_layout.addWidget(self.stop_button)
         buttons_layout.addWidget(self.ok_button)
 
-        main_layout.addLayout(buttons_layout, 3, 0, 1, -1)
+        main_layout.addLayout(buttons_layout, 4, 0, 1, -1)
 
         self.show()
         self.ok_button.setFocus()
@@ -142,42 +183,143 @@ class MainWindow(QtWidgets.QWidget):
         w.accepted.connect(self.update_warning)
         w.open()
 
-    def start_parsing(self, event=None):
-        try:
-            attributes_to_delete = core.find_attributes_to_delete(self.bk, self.prefs)
-        except core.CSSParsingError as E:
-            QtWidgets.QMessageBox(
-                QtWidgets.QMessageBox.Critical,
-                'Error while parsing stylesheets',
-                f'{E}\nThe plugin will terminate.',
-                QtWidgets.QMessageBox.Ok,
-                self
-            ).exec()
-            QtWidgets.QApplication.exit(2)
-        except core.XMLParsingError as E:
-            QtWidgets.QMessageBox(
-                QtWidgets.QMessageBox.Critical,
-                'Error while parsing an XML or XHTML file',
-                f'{E}\nThe plugin will terminate.',
-                QtWidgets.QMessageBox.Ok,
-                self
-            ).exec()
-            QtWidgets.QApplication.exit(2)
+    def cancel(self, event=None):
+        if self.task_worker is not None:
+            # the task stops before the next file
+            self.stop_button.setEnabled(False)
+            self.progress_label.setText('Cancelling...')
+            self.task_worker.cancel()
         else:
-            self.populate_text_widgets(attributes_to_delete)
-            self.top_label.setText(
-                'Select classes and ids that you want to remove from your xhtml, '
-                'then press again the "Proceed" button.'
+            QtWidgets.QApplication.exit(0)
+
+    def closeEvent(self, event):
+        if self.task_worker is not None:
+            on_success, on_cancel, on_finish = self.task_callbacks
+            # the queued signals of the task would be delivered
+            # to a closed window, if at all
+            self.task_worker.blockSignals(True)
+            self.task_worker.cancel()
+            self.finish_task()
+            if on_cancel == self.deletion_cancelled:
+                on_cancel()
+        super().closeEvent(event)
+
+    def run_task(self, messages, function, *args, on_success=None, on_cancel=None, on_finish=None):
+        """
+        Call function(*args) in a worker thread, showing its progress
+        with the messages for each phase (a dictionary phase: message).
+        Then call on_success with the return value of function
+        or on_cancel if the user cancelled the task.
+        on_finish is called first, whatever the outcome of the task.
+        """
+        self.ok_button.setEnabled(False)
+        self.prefs_button.setEnabled(False)
+        self.paned_window.setEnabled(False)
+        self.progress_bar.setRange(0, 0)
+        self.progress_label.setText('')
+        self.progress_bar.show()
+        self.progress_label.show()
+        self.task_messages = messages
+        self.task_callbacks = (on_success, on_cancel, on_finish)
+
+        # the signals of the worker are connected to methods of the window,
+        # so that they are delivered in the gui thread
+        self.task_thread = QtCore.QThread(self)
+        self.task_worker = TaskWorker(function, *args)
+        self.task_worker.moveToThread(self.task_thread)
+        self.task_thread.started.connect(self.task_worker.run)
+        self.task_worker.progressed.connect(self.show_progress)
+        self.task_worker.succeeded.connect(self.task_succeeded)
+        self.task_worker.failed.connect(self.task_failed)
+        self.task_worker.cancelled.connect(self.task_cancelled)
+        self.task_thread.start()
+
+    def show_progress(self, phase: str, done: int, total: int, href: str):
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+        if self.task_worker is not None and self.stop_button.isEnabled():
+            self.progress_label.setText(
+                '{} {}'.format(self.task_messages.get(phase, ''), utils.href_to_basename(href))
             )
-            self.prefs_button.setEnabled(False)
-            self.warning_label.setText(
-                'The search for classes and ids to remove has been done on {} files.'.format(
-                    'selected' if self.prefs['parse_only_selected_files'] else 'all xhtml'
-                )
+
+    def finish_task(self):
+        on_finish = self.task_callbacks[2]
+        if on_finish is not None:
+            on_finish()
+        self.task_thread.quit()
+        self.task_thread.wait()
+        self.task_thread = self.task_worker = None
+        self.progress_bar.hide()
+        self.progress_label.hide()
+        self.ok_button.setEnabled(True)
+        self.stop_button.setEnabled(True)
+        self.paned_window.setEnabled(True)
+
+    def task_succeeded(self, result):
+        self.finish_task()
+        on_success, on_cancel, on_finish = self.task_callbacks
+        if on_success is not None:
+            on_success(result)
+
+    def task_failed(self, error: Exception):
+        self.finish_task()
+        self.show_error(error)
+
+    def task_cancelled(self):
+        self.finish_task()
+        on_success, on_cancel, on_finish = self.task_callbacks
+        if on_cancel is not None:
+            on_cancel()
+
+    def show_error(self, error: Exception):
+        if isinstance(error, core.CSSParsingError):
+            title = 'Error while parsing stylesheets'
+        elif isinstance(error, core.XMLParsingError):
+            title = 'Error while parsing an XML or XHTML file'
+        else:
+            raise error
+        QtWidgets.QMessageBox(
+            QtWidgets.QMessageBox.Critical,
+            title,
+            f'{error}\nThe plugin will terminate.',
+            QtWidgets.QMessageBox.Ok,
+            self
+        ).exec()
+        QtWidgets.QApplication.exit(2)
+
+    def start_parsing(self, event=None):
+        self.run_task(
+            {
+                'css': 'Searching classes and ids in stylesheet',
+                'xhtml': 'Searching classes and ids in',
+                'xml': 'Searching references in',
+            },
+            core.find_attributes_to_delete, self.bk, self.prefs,
+            on_success=self.show_attributes_to_delete,
+            on_cancel=self.parsing_cancelled
+        )
+
+    def parsing_cancelled(self):
+        self.top_label.setText(
+            'The search has been cancelled. Press the "Proceed" button to start it again.'
+        )
+        self.prefs_button.setEnabled(True)
+
+    def show_attributes_to_delete(self, attributes_to_delete: dict):
+        self.populate_text_widgets(attributes_to_delete)
+        self.top_label.setText(
+            'Select classes and ids that you want to remove from your xhtml, '
+            'then press again the "Proceed" button.'
+        )
+        self.prefs_button.setEnabled(False)
+        self.warning_label.setText(
+            'The search for classes and ids to remove has been done on {} files.'.format(
+                'selected' if self.prefs['parse_only_selected_files'] else 'all xhtml'
             )
-            if self.ok_button.clicked.connect(self.start_parsing):
-                self.ok_button.clicked.disconnect()
-            self.ok_button.clicked.connect(self.delete_selected_attributes)
+        )
+        if self.ok_button.clicked.connect(self.start_parsing):
+            self.ok_button.clicked.disconnect()
+        self.ok_button.clicked.connect(self.delete_selected_attributes)
 
     def populate_text_widgets(self, attributes_list: dict):
         self.undefined_attributes = attributes_list
@@ -215,28 +357,18 @@ class MainWindow(QtWidgets.QWidget):
             self.toggle_classes.setChecked(True)
             self.toggle_classes.stateChanged().connect(self.toggle_all_classes)
             self.classes_frame_layout.addWidget(self.toggle_classes)
-            
-            self._display_attributes_checkboxes(
+
+            self._display_attributes_list(
                 attributes_list,
                 'classes',
-                self.classes_frame_layout,
-                margins_checkboxes,
-                alternateBgColor
+                self.classes_frame_layout
             )
         else:
             no_classes_label = QtWidgets.QLabel('I found no unreferenced classes.')
             no_classes_label.setWordWrap(True)
             no_classes_label.setContentsMargins(*margins_checkboxes)
             self.classes_frame_layout.addWidget(no_classes_label)
-
-        classes_bottom_separator = QtWidgets.QFrame()
-        classes_bottom_separator.setFrameShape(QtWidgets.QFrame.HLine)
-        classes_bottom_separator.setFrameShadow(QtWidgets.QFrame.Raised)
-        classes_bottom_separator.setLineWidth(0)
-        classes_bottom_separator.setMidLineWidth(1)
-        self.classes_frame_layout.addWidget(classes_bottom_separator)
-
-        self.classes_frame_layout.addStretch()
+            self.classes_frame_layout.addStretch()
 
         ids_header = QtWidgets.QLabel(
             'Ids found in XHTML without references in CSS nor in other XHTML or XML files.\n' \
@@ -265,69 +397,60 @@ class MainWindow(QtWidgets.QWidget):
             self.toggle_ids.stateChanged().connect(self.toggle_all_ids)
             self.ids_frame_layout.addWidget(self.toggle_ids)
 
-            self._display_attributes_checkboxes(
+            self._display_attributes_list(
                 attributes_list,
                 'ids',
-                self.ids_frame_layout,
-                margins_checkboxes,
-                alternateBgColor
+                self.ids_frame_layout
             )
         else:
             no_ids_label = QtWidgets.QLabel('I found no unreferenced ids.')
             no_ids_label.setWordWrap(True)
             no_ids_label.setContentsMargins(*margins_checkboxes)
             self.ids_frame_layout.addWidget(no_ids_label)
+            self.ids_frame_layout.addStretch()
 
-        ids_bottom_separator = QtWidgets.QFrame()
-        ids_bottom_separator.setFrameShape(QtWidgets.QFrame.HLine)
-        ids_bottom_separator.setFrameShadow(QtWidgets.QFrame.Raised)
-        ids_bottom_separator.setLineWidth(0)
-        ids_bottom_separator.setMidLineWidth(1)
-        self.ids_frame_layout.addWidget(ids_bottom_separator)
-
-        self.ids_frame_layout.addStretch()
-
-    def _display_attributes_checkboxes(self, attr_list, attr_type, layout, margins, alternateBgColor):
-        for i, attr in enumerate(attr_list[attr_type]):
-            occurrences = ', '.join(
-                f'{utils.href_to_basename(filename)} ({times})' \
-                for filename, times in attr_list[f'info_{attr_type}'][attr].items()
-            )
-            checkbox = WrappingCheckBox(
-                f'{attr}  -  Found in: {occurrences}',
-                margins=margins,
-            )
-            checkbox.setChecked(True)
-            if i % 2 == 0:
-                palette = checkbox.palette()
-                palette.setColor(checkbox.backgroundRole(), alternateBgColor)
-                checkbox.setPalette(palette)
-            self.check_undefined_attributes[f'{attr_type}'][attr] = checkbox
-            layout.addWidget(checkbox)
+    def _display_attributes_list(self, attr_list, attr_type, layout):
+        model = AttributesModel(attr_list, attr_type, self)
+        view = AttributesView()
+        view.setFrameShape(QtWidgets.QFrame.NoFrame)
+        view.setModel(model)
+        self.attributes_models[attr_type] = model
+        layout.addWidget(view, stretch=1)
 
     def toggle_all_classes(self, event=None):
-        checked = self.toggle_classes.isChecked()
-        for class_, checkbox in self.check_undefined_attributes['classes'].items():
-            checkbox.setChecked(checked)
+        self.attributes_models['classes'].setAllChecked(self.toggle_classes.isChecked())
 
     def toggle_all_ids(self, event=None):
-        checked = self.toggle_ids.isChecked()
-        for id_, checkbox in self.check_undefined_attributes['ids'].items():
-            checkbox.setChecked(checked)
+        self.attributes_models['ids'].setAllChecked(self.toggle_ids.isChecked())
 
     def delete_selected_attributes(self, event=None):
-        for attr_type, attributes in self.check_undefined_attributes.items():
-            for attribute, has_to_be_deleted in attributes.items():
-                if not has_to_be_deleted.isChecked():
-                    self.undefined_attributes[attr_type].discard(attribute)
-        try:
-            core.delete_xhtml_attributes(self.bk, self.undefined_attributes, self.prefs)
-        finally:
-            # reset selected files on success
-            self.prefs['selected_files'] = []
-            self.bk.savePrefs(self.prefs)
+        for attr_type, model in self.attributes_models.items():
+            for attribute in model.uncheckedAttributes():
+                self.undefined_attributes[attr_type].discard(attribute)
+        self.run_task(
+            {'delete': 'Removing classes and ids from'},
+            core.delete_xhtml_attributes, self.bk, self.undefined_attributes, self.prefs,
+            on_success=self.attributes_deleted,
+            on_cancel=self.deletion_cancelled,
+            on_finish=self.reset_selected_files
+        )
+
+    def attributes_deleted(self, written_files: dict):
+        print('{written} files modified, {skipped} files unchanged.'.format(**written_files))
         QtWidgets.QApplication.exit(0)
 
+    def reset_selected_files(self):
+        # whether the deletion succeeded or not
+        self.prefs['selected_files'] = []
+        self.bk.savePrefs(self.prefs)
+
+    def deletion_cancelled(self):
+        # some files may be already modified: a non-zero exit status
+        # tells Sigil to discard every change
+        print('Deletion cancelled: the book has not been modified.')
+        self.deletion_interrupted = True
+        QtWidgets.QApplication.exit(1)
+
 
 class PrefsDialog(QtWidgets.QDialog):
 
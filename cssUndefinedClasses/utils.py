@@ -25,7 +25,7 @@ Collection of utilities for Sigil plugins.
 import re
 import inspect
 from pathlib import Path
-from functools import reduce
+from functools import reduce, lru_cache
 
 
 SCRIPT_DIR = Path(inspect.getfile(inspect.currentframe())).resolve().parent
@@ -58,32 +58,51 @@ except ModuleNotFoundError:
     print("Tkinter/ttk module not found.")
 
 
+# Maximum number of texts (and of words) whose tokens and widths are remembered.
+TEXT_CACHE_SIZE = 16384
+
 try:
     from plugin_utils import QtCore, QtGui
 
+    @lru_cache(maxsize=None)
+    def _all_boundary_reasons():
+        try:
+            # BreakOpportunity doesn't come up while iterating over BoundaryReason flags
+            # (PySide 6.9), so I use it as the initializer of the reduce function
+            return reduce(
+                lambda x, y: x | y,
+                QtCore.QTextBoundaryFinder.BoundaryReasons,
+                QtCore.QTextBoundaryFinder.BreakOpportunity
+            )
+        except TypeError:
+            # PyQt5 doesn't allow iterations over Qt enums
+            return (
+                QtCore.QTextBoundaryFinder.StartOfItem
+                | QtCore.QTextBoundaryFinder.EndOfItem
+                | QtCore.QTextBoundaryFinder.MandatoryBreak
+                | QtCore.QTextBoundaryFinder.SoftHyphen
+                | QtCore.QTextBoundaryFinder.BreakOpportunity
+            )
+
     def tokenize_text(text, boundary_type, boundary_reasons=None):
         """
         Divide text in a list of tokens based on boundary_type.
         boundary_types: Grapheme, Word, Line or Sentence
+        Tokens for the default boundary_reasons are cached
+        for the whole process (see cached_tokens).
         """
         if boundary_reasons is None:
-            try:
-                # BreakOpportunity doesn't come up while iterating over BoundaryReason flags
-                # (PySide 6.9), so I use it as the initializer of the reduce function
-                boundary_reasons = reduce(
-                    lambda x, y: x | y,
-                    QtCore.QTextBoundaryFinder.BoundaryReasons,
-                    QtCore.QTextBoundaryFinder.BreakOpportunity
-                )
-            except TypeError:
-                # PyQt5 doesn't allow iterations over Qt enums
-                boundary_reasons = (
-                    QtCore.QTextBoundaryFinder.StartOfItem
-                    | QtCore.QTextBoundaryFinder.EndOfItem
-                    | QtCore.QTextBoundaryFinder.MandatoryBreak
-                    | QtCore.QTextBoundaryFinder.SoftHyphen
-                    | QtCore.QTextBoundaryFinder.BreakOpportunity
-                )
+            return list(cached_tokens(text, boundary_type))
+        return _tokenize_text(text, boundary_type, boundary_reasons)
+
+    @lru_cache(maxsize=TEXT_CACHE_SIZE)
+    def cached_tokens(text, boundary_type) -> tuple:
+        """
+        Tokens of text for every boundary reason, as a tuple shared by all callers.
+        """
+        return tuple(_tokenize_text(text, boundary_type, _all_boundary_reasons()))
+
+    def _tokenize_text(text, boundary_type, boundary_reasons):
         tbf = QtCore.QTextBoundaryFinder(boundary_type, text)
         tokens = []
         pos = prev = tbf.position()
@@ -97,15 +116,30 @@ try:
                 prev = pos
         return tokens
 
+    # QFontMetricsF of every font used to measure words, keyed by QFont.key()
+    _font_metrics = {}
+
     def compute_words_length(words, font):
         """
         Compute the width of every word in words using the QFont font.
+        Widths are cached for the whole process by word and font.
+        """
+        font_key = font.key()
+        if font_key not in _font_metrics:
+            _font_metrics[font_key] = QtGui.QFontMetricsF(font)
+        return [_word_width(word, font_key) for word in words]
+
+    @lru_cache(maxsize=TEXT_CACHE_SIZE)
+    def _word_width(word, font_key):
+        return _font_metrics[font_key].horizontalAdvance(word)
+
+    @lru_cache(maxsize=TEXT_CACHE_SIZE)
+    def breakable_word(word):
+        """
+        Return word with a zero width space between its graphemes,
+        so that it can be wrapped anywhere.
         """
-        fontMetrics = QtGui.QFontMetricsF(font)
-        lengths = []
-        for word in words:
-            lengths.append(fontMetrics.horizontalAdvance(word))
-        return lengths
+        return '\u200B'.join(cached_tokens(word, QtCore.QTextBoundaryFinder.BoundaryType.Grapheme))
 
 except ModuleNotFoundError:
     print("plugin_utils module (PyQt5/PySide6 integration) not found.")
@@ -14,8 +14,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import bisect
+
 from plugin_utils import QtWidgets, Qt, QtCore, QtGui
-from utils import tokenize_text, compute_words_length
+from utils import tokenize_text, compute_words_length, breakable_word
+
+
+# Number of composed texts remembered by every WrappingLabel.
+COMPOSED_TEXTS_MEMO_SIZE = 8
 
 
 class WrappingCheckBox(QtWidgets.QWidget):
@@ -149,12 +155,18 @@ class WrappingLabel(QtWidgets.QLabel):
         self._length_index = -1
         self._reset_text()
 
-    def _update_length_index(self):
-        available_width = self.width() - 5
-        for i in range(len(self._text['sorted_lengths'])):
-            if self._text['sorted_lengths'][i] <= available_width <= self._text['sorted_lengths'][i + 1]:
-                self._length_index = i
-                break
+    def _update_length_index(self, available_width):
+        """
+        Set the length index to the number of distinct word lengths
+        not greater than available_width: the words that are longer
+        (and are shown breakable) are the same for every width
+        with the same index. Return True if the index changed.
+        """
+        index = bisect.bisect_right(self._text['sorted_lengths'], available_width)
+        if index == self._length_index:
+            return False
+        self._length_index = index
+        return True
 
     def _reset_text(self):
         new_text = self._compose_text(self.width() - 5)
@@ -162,30 +174,37 @@ class WrappingLabel(QtWidgets.QLabel):
             super().setText(new_text)
 
     def _compose_text(self, available_width):
-        lengths, i = self._text['sorted_lengths'], self._length_index
-        if i != -1 and lengths[i] <= available_width <= lengths[i + 1]:
+        """
+        Return the text to display in available_width,
+        or None if it's the text already displayed.
+        """
+        if not self._update_length_index(available_width):
             return
-        self._update_length_index()
-        words = []
-        for i, word in enumerate(self._text['words']):
-            if available_width < self._text['lengths'][i]:
-                next_word = self._text['breakable_words'][i]
-            else:
-                next_word = word
-            words.append(next_word)
-        return ''.join(words)
+        composed_texts = self._text['composed_texts']
+        text = composed_texts.get(self._length_index)
+        if text is None:
+            words = []
+            for i, word in enumerate(self._text['words']):
+                if available_width < self._text['lengths'][i]:
+                    next_word = self._text['breakable_words'][i]
+                else:
+                    next_word = word
+                words.append(next_word)
+            text = ''.join(words)
+            if len(composed_texts) >= COMPOSED_TEXTS_MEMO_SIZE:
+                del composed_texts[next(iter(composed_texts))]
+            composed_texts[self._length_index] = text
+        return text
 
     def _preprocess_text(self, text):
         words = tokenize_text(text, QtCore.QTextBoundaryFinder.BoundaryType.Line)
         lengths = compute_words_length(words, self.font())
-        breakable_words = []
-        for word in words:
-            graphemes = tokenize_text(word, QtCore.QTextBoundaryFinder.BoundaryType.Grapheme)
-            breakable_words.append('\u200B'.join(graphemes))
+        breakable_words = [breakable_word(word) for word in words]
         sorted_lengths = [0, *sorted(list(set(lengths))), 999999]
         return {
             'words': words,
             'breakable_words': breakable_words,
             'lengths': lengths,
             'sorted_lengths': sorted_lengths,
+            'composed_texts': {},  # length index: text
         }
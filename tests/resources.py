@@ -109,5 +109,13 @@ markup_samples = {
     </seq>
   </body>
 </smil>
+''',
+
+    'svg1':
+'''<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:xl="http://www.w3.org/1999/xlink" version="1.1">
+  <defs><linearGradient id="grad"/></defs>
+  <a xl:href="Section0001.xhtml#svg_link%20target"><use xl:href="#grad" href="#unused"/></a>
+</svg>
 '''
-}
\ No newline at end of file
+}
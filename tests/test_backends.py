@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# Copyright (c) 2026 Francesco Martini
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from bookcontainer import BookContainer
+
+import backends
+import core
+from tests import resources
+
+
+EPUB_TEST_PATH = Path(__file__).resolve().parent.parent / 'functional_tests' / 'resources' / 'epub_test' / 'OEBPS'
+
+ATTRS_NAMES = (
+    core.XHTMLAttributes.fragid_container_attrs,
+    core.XHTMLAttributes.idref_container_attrs,
+    core.XHTMLAttributes.idref_list_container_attrs,
+)
+
+
+class BackendTest(unittest.TestCase):
+
+    def backends(self):
+        yield backends.GumboBackend()
+        if backends.etree is not None:
+            yield backends.LxmlBackend()
+
+    def rewrite_backends(self):
+        return (backend for backend in self.backends() if isinstance(backend, backends.RewriteBackend))
+
+    def test_element_interface(self):
+        text = resources.markup_samples['xhtml1']
+        for backend in self.backends():
+            with self.subTest(backend=backend.name):
+                document = backend.parse(text)
+                elements = list(backend.iter_elements(document))
+                paragraphs = [elem for elem in elements if backend.tag_name(elem) == 'p']
+                self.assertEqual(len(paragraphs), 5)
+                self.assertEqual(backend.classes(paragraphs[0]), ['aclass', 'anotherclass'])
+                self.assertEqual(backend.get_attribute(paragraphs[0], 'class'), 'aclass anotherclass')
+                self.assertIsNone(backend.get_attribute(paragraphs[0], 'id'))
+                style = next(elem for elem in elements if backend.tag_name(elem) == 'style')
+                self.assertEqual(backend.text(style).strip(), '.definedinstyleclass {}')
+
+    def test_edit_and_serialize(self):
+        text = resources.markup_samples['xhtml1']
+        for backend in self.rewrite_backends():
+            with self.subTest(backend=backend.name):
+                document = backend.parse(text)
+                elements = list(backend.iter_elements(document))
+                paragraphs = [elem for elem in elements if backend.tag_name(elem) == 'p']
+                backend.set_attribute(paragraphs[0], 'class', 'aclass')
+                backend.delete_attribute(paragraphs[2], 'id')
+                serialized = backend.serialize(document)
+                self.assertIn('<?xml version="1.0" encoding="UTF-8" ?>', serialized)
+                self.assertIn('<p class="aclass">first', serialized)
+                self.assertIn('<p>third par</p>', serialized)
+
+    def test_extraction_same_as_gumbo(self):
+        if backends.etree is None:
+            self.skipTest('lxml not available')
+        gumbo, lxml = backends.GumboBackend(), backends.LxmlBackend()
+        texts = [resources.markup_samples['xhtml1']]
+        texts.extend(path.read_text(encoding='utf-8') for path in sorted(EPUB_TEST_PATH.glob('*.xhtml')))
+        for i, text in enumerate(texts):
+            with self.subTest(file=i):
+                self.assertEqual(
+                    core.extract_xhtml_attributes(lxml.parse(text), *ATTRS_NAMES, backend=lxml),
+                    core.extract_xhtml_attributes(gumbo.parse(text), *ATTRS_NAMES, backend=gumbo)
+                )
+
+    def test_remove_attributes_from_tree(self):
+        text = resources.markup_samples['xhtml1']
+        for backend in self.rewrite_backends():
+            with self.subTest(backend=backend.name):
+                document = backend.parse(text)
+                self.assertTrue(core.remove_attributes_from_tree(
+                    document, {'undefinedclass', 'aclass'}, {'undefinedid'}, backend
+                ))
+                serialized = backend.serialize(document)
+                self.assertIn('<p class="anotherclass">first', serialized)
+                self.assertIn('<p class="definedinstyleclass">second', serialized)
+                self.assertIn('<p>third par</p>', serialized)
+                self.assertIn('<p><a id="someanchor">', serialized)
+                self.assertFalse(core.remove_attributes_from_tree(document, {'aclass'}, {'undefinedid'}, backend))
+
+    def test_dom_rewrite_round_trip(self):
+        """
+        Empty elements, foreign attributes and <style> survive the dom rewrite
+        with every parser backend (trees of lxml are never serialized).
+        """
+        text = (
+            '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+            '<html xmlns="http://www.w3.org/1999/xhtml"><head><title></title>'
+            '<style>p > a {}</style><script src="a.js"></script></head>\n'
+            '<body><p class="x y"></p><div id="d"></div><a id="e"></a>'
+            '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 10 10"><linearGradient id="g"/></svg>'
+            '</body></html>'
+        )
+        bk = Mock(spec_set=BookContainer)
+        bk.text_iter.side_effect = lambda: iter([('xhtml1', 'Text/a.xhtml')])
+        bk.readfile.return_value = text
+        bk.writefile.side_effect = None
+        attributes = {'classes': {'x'}, 'ids': {'d'}}
+        for name in backends.BACKENDS:
+            with self.subTest(backend=name):
+                prefs = {
+                    'parse_only_selected_files': False, 'selected_files': [],
+                    'parser_backend': name, 'rewrite_engine': 'dom'
+                }
+                self.assertEqual(
+                    core.delete_xhtml_attributes(bk, attributes, prefs), {'written': 1, 'skipped': 0}
+                )
+                written = bk.writefile.call_args[0][1]
+                for fragment in (
+                        '<title></title>', '<style>p > a {}</style>', '<script src="a.js"></script>',
+                        '<p class="y"></p>', '<div></div>', '<a id="e"></a>', 'viewBox="0 0 10 10"'
+                ):
+                    self.assertIn(fragment, written)
+        self.assertTrue(backends.can_serialize('gumbo'))
+        self.assertFalse(backends.can_serialize('lxml'))
+
+    def test_get_backend(self):
+        self.assertIsInstance(backends.get_backend(), backends.GumboBackend)
+        with patch('builtins.print'):
+            self.assertIsInstance(backends.get_backend('missing'), backends.GumboBackend)
+        if backends.etree is not None:
+            self.assertIsInstance(backends.get_backend('lxml'), backends.LxmlBackend)
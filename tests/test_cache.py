@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# Copyright (c) 2026 Francesco Martini
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import cache
+
+
+class DocumentCacheTest(unittest.TestCase):
+
+    def test_put_and_pop(self):
+        documents = cache.DocumentCache(100)
+        documents.put('xhtml1', 'soup1', 10)
+        self.assertIn('xhtml1', documents)
+        self.assertEqual(documents.size, 10)
+        self.assertEqual(documents.pop('xhtml1'), 'soup1')
+        self.assertNotIn('xhtml1', documents)
+        self.assertEqual(documents.size, 0)
+        self.assertIsNone(documents.pop('xhtml1'))
+
+    def test_evict_least_recently_used(self):
+        documents = cache.DocumentCache(30)
+        documents.put('xhtml1', 'soup1', 10)
+        documents.put('xhtml2', 'soup2', 10)
+        documents.put('xhtml3', 'soup3', 10)
+        documents.get('xhtml1')
+        documents.put('xhtml4', 'soup4', 15)
+        self.assertIn('xhtml1', documents)
+        self.assertNotIn('xhtml2', documents)
+        self.assertNotIn('xhtml3', documents)
+        self.assertIn('xhtml4', documents)
+        self.assertEqual(documents.size, 25)
+
+    def test_document_bigger_than_cache(self):
+        documents = cache.DocumentCache(30)
+        documents.put('xhtml1', 'soup1', 10)
+        documents.put('xhtml2', 'soup2', 31)
+        self.assertIn('xhtml1', documents)
+        self.assertNotIn('xhtml2', documents)
+        self.assertEqual(documents.size, 10)
+
+
+class ExtractionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / 'cache' / 'xhtml.sqlite'
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_make_key(self):
+        key = cache.ExtractionCache.make_key('<p class="a"/>', ['href'], False)
+        self.assertEqual(key, cache.ExtractionCache.make_key('<p class="a"/>', ['href'], False))
+        self.assertNotEqual(key, cache.ExtractionCache.make_key('<p class="b"/>', ['href'], False))
+        self.assertNotEqual(key, cache.ExtractionCache.make_key('<p class="a"/>', ['src'], False))
+        self.assertNotEqual(key, cache.ExtractionCache.make_key('<p class="a"/>', ['href'], True))
+
+    def test_save_and_load(self):
+        extraction_cache = cache.ExtractionCache(self.path)
+        extraction_cache.put('key1', {'classes': {'aclass': 2}})
+        extraction_cache.save()
+        self.assertTrue(self.path.is_file())
+        extraction_cache = cache.ExtractionCache(self.path)
+        self.assertEqual(extraction_cache.get('key1'), {'classes': {'aclass': 2}})
+        self.assertIsNone(extraction_cache.get('key2'))
+
+    def test_keep_most_recently_used(self):
+        # every value is 1 byte long as json
+        extraction_cache = cache.ExtractionCache(self.path, max_size=2)
+        extraction_cache.put('key1', 1)
+        extraction_cache.put('key2', 2)
+        extraction_cache.save()
+        extraction_cache = cache.ExtractionCache(self.path, max_size=2)
+        self.assertEqual(extraction_cache.get('key1'), 1)
+        extraction_cache.put('key3', 3)
+        extraction_cache.save()
+        extraction_cache = cache.ExtractionCache(self.path)
+        self.assertEqual(extraction_cache.get('key1'), 1)
+        self.assertIsNone(extraction_cache.get('key2'))
+        self.assertEqual(extraction_cache.get('key3'), 3)
+
+    def test_bounded_by_size(self):
+        extraction_cache = cache.ExtractionCache(self.path, max_size=1000)
+        for i in range(100):
+            extraction_cache.put('key{}'.format(i), 'x' * 98)  # 100 bytes as json
+            extraction_cache.save()
+        extraction_cache = cache.ExtractionCache(self.path)
+        kept = [i for i in range(100) if extraction_cache.get('key{}'.format(i)) is not None]
+        self.assertEqual(kept, list(range(90, 100)))
+        extraction_cache.close()
+
+    def test_unsaved_entries(self):
+        extraction_cache = cache.ExtractionCache(self.path)
+        extraction_cache.put('key1', [1, 2])
+        self.assertEqual(extraction_cache.get('key1'), [1, 2])
+        extraction_cache.close()
+        self.assertIsNone(cache.ExtractionCache(self.path).get('key1'))
+
+    def test_corrupted_file(self):
+        self.path.parent.mkdir(parents=True)
+        self.path.write_text('{"version": 1, "entr')
+        extraction_cache = cache.ExtractionCache(self.path)
+        self.assertIsNone(extraction_cache.get('key1'))
+        extraction_cache.put('key1', 1)
+        extraction_cache.save()
+        # the file is replaced on the next run
+        self.assertFalse(self.path.exists())
+        extraction_cache = cache.ExtractionCache(self.path)
+        extraction_cache.put('key1', 1)
+        extraction_cache.save()
+        self.assertEqual(cache.ExtractionCache(self.path).get('key1'), 1)
+
+    def test_other_version(self):
+        extraction_cache = cache.ExtractionCache(self.path)
+        extraction_cache.put('key1', 1)
+        extraction_cache.save()
+        with patch.object(cache.ExtractionCache, 'version', cache.ExtractionCache.version + 1):
+            extraction_cache = cache.ExtractionCache(self.path)
+            self.assertIsNone(extraction_cache.get('key1'))
+            extraction_cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
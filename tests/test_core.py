@@ -18,7 +18,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import tempfile
+import itertools
 import unittest
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, BrokenExecutor
 from unittest.mock import Mock, patch
 
 import core
@@ -28,6 +32,9 @@ from tests import resources
 from bookcontainer import BookContainer
 
 
+EPUB_TEST_PATH = Path(__file__).resolve().parent.parent / 'functional_tests' / 'resources' / 'epub_test' / 'OEBPS'
+
+
 class Parser(unittest.TestCase):
 
     def setUp(self):
@@ -63,6 +70,86 @@ class CSSParserTest(Parser):
             {'anid'}
         )
 
+    def test_parse_css_with_cache(self):
+        self.bk.css_iter.side_effect = lambda: bk_css_iter([('css1', 'href1')])
+        collector = self.cssparser.parse_css(self.bk)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'css.sqlite'
+            cache = core.ExtractionCache(path)
+            self.cssparser.parse_css(self.bk, cache=cache)
+            cache.save()
+            cache = core.ExtractionCache(path)
+            with patch.object(self.cssparser.cssparser, 'parseString') as parse_string:
+                cached_collector = self.cssparser.parse_css(self.bk, cache=cache)
+            parse_string.assert_not_called()
+            # the mode of the ident tokens is part of the key
+            with patch.object(core.CSSParser, 'extract_attributes', return_value=core.CSSAttributes()) as extract:
+                core.CSSParser(accept_invalid_tokens=False).parse_css(self.bk, cache=cache)
+            extract.assert_called_once()
+        self.assertEqual(cached_collector.classes, collector.classes)
+        self.assertEqual(cached_collector.ids, collector.ids)
+
+    def test_parse_css_with_scanner(self):
+        self.bk.css_iter.side_effect = lambda: bk_css_iter([('css1', 'href1')])
+        collector = self.cssparser.parse_css(self.bk)
+        with patch.object(core.css_parser.CSSParser, 'parseString') as parse_string:
+            scanner_collector = core.CSSParser(engine='scanner').parse_css(self.bk)
+        parse_string.assert_not_called()
+        self.assertEqual(scanner_collector.classes, collector.classes)
+        self.assertEqual(scanner_collector.ids, collector.ids)
+        css_text = '[ class = "x" ] {} [class ~= y] {} p[ id="z" ] {} [class= "w"] {} [ id ^= \'v\' ] {}'
+        scanner_attributes = core.CSSParser(engine='scanner').extract_attributes(css_text)
+        attributes = self.cssparser.extract_attributes(css_text)
+        self.assertEqual(scanner_attributes.classes['equal'], {'x', 'w'})
+        self.assertEqual(scanner_attributes.classes, attributes.classes)
+        self.assertEqual(scanner_attributes.ids, attributes.ids)
+        self.bk.css_iter.side_effect = lambda: bk_css_iter([('css2', 'href2')])
+        self.assertRaisesRegex(
+            core.CSSParsingError, r'^Error in href2:', core.CSSParser(engine='scanner').parse_css, self.bk
+        )
+
+    def test_parse_css_in_parallel(self):
+        sheets = [('css1', 'href1'), ('css1', 'href2')]
+        self.bk.css_iter.side_effect = lambda: bk_css_iter(sheets)
+        collector = self.cssparser.parse_css(self.bk)
+        with patch('core.PARALLEL_CSS_MIN_SIZE', 0), \
+                patch('core.extract_css_in_pool', wraps=core.extract_css_in_pool) as pool:
+            parallel_collector = self.cssparser.parse_css(self.bk, max_workers=2)
+            pool.assert_called_once()
+            self.assertEqual(parallel_collector.classes, collector.classes)
+            self.assertEqual(parallel_collector.ids, collector.ids)
+            sheets = [('css1', 'href1'), ('css2', 'href2')]
+            self.assertRaisesRegex(
+                core.CSSParsingError, r'^Error in href2:', self.cssparser.parse_css, self.bk, max_workers=2
+            )
+
+    def test_process_pool_start_method(self):
+        with patch('core.concurrent.futures.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as executor:
+            with core.process_pool(1):
+                pass
+        executor.assert_called_once()
+        self.assertEqual(executor.call_args.kwargs['mp_context'].get_start_method(), core.POOL_START_METHOD)
+        self.assertEqual(core.POOL_START_METHOD, 'spawn')
+
+    def test_parse_css_pool_fallback_progress(self):
+        sheets = [('css1', 'href1'), ('css1', 'href2'), ('css1', 'href3')]
+        self.bk.css_iter.side_effect = lambda: bk_css_iter(sheets)
+        events = []
+        progress = core.Progress(lambda event, p: events.append((event, p.done_files, p.done_bytes)))
+
+        def broken_pool(pending, max_workers, accept_invalid_tokens, engine, on_done):
+            on_done(pending[0][0])
+            raise BrokenExecutor('a worker died')
+
+        with patch('core.PARALLEL_CSS_MIN_SIZE', 0), patch('core.extract_css_in_pool', side_effect=broken_pool):
+            collector = self.cssparser.parse_css(self.bk, max_workers=2, progress=progress)
+        self.assertEqual(collector.classes['classes'], {'aclass', 'anotherclass', 'yetanotherclass', 'wholenameclass'})
+        # the serial parsing starts counting from scratch
+        self.assertEqual(events.count(('phase_started', 0, 0)), 2)
+        self.assertEqual(progress.done_files, len(sheets))
+        self.assertEqual(progress.done_bytes, progress.total_bytes)
+        self.assertLessEqual(max(done for event, done, done_bytes in events), len(sheets))
+
     def test_parse_css_parsing_error(self):
         self.bk.css_iter.side_effect = lambda: bk_css_iter([('css2', 'href2')])
         self.assertRaises(core.CSSParsingError, self.cssparser.parse_css, self.bk)
@@ -94,6 +181,19 @@ class CSSParserTest(Parser):
             {'containsclass', 'contains class'}
         )
 
+    def test_parse_style_parsed_once(self):
+        first = self.cssparser.parse_style(resources.css_samples['css1'], filename='css1')
+        collector = core.CSSAttributes()
+        collector.classes['classes'].add('previousclass')
+        with patch.object(self.cssparser.cssparser, 'parseString') as parse_string:
+            self.cssparser.parse_style(resources.css_samples['css1'], collector, filename='css1')
+        parse_string.assert_not_called()
+        self.assertEqual(collector.classes['classes'], first.classes['classes'] | {'previousclass'})
+        for key in ('equal', 'startswith', 'endswith', 'contains'):
+            with self.subTest(key=key):
+                self.assertEqual(collector.classes[key], first.classes[key])
+        self.assertEqual(collector.ids, first.ids)
+
     def test_parse_style_parsing_error(self):
         self.assertRaisesRegex(
             core.CSSParsingError,
@@ -232,6 +332,17 @@ class CSSParserTest(Parser):
                 else:
                     self.assertEqual(v, set())
 
+    def test_parse_selector_long_compound_selector(self):
+        collector = core.CSSAttributes()
+        selector = ''.join(
+            f'div.c{i}#i{i}[class^="p{i}\\"x"][id$=s{i}] > ' for i in range(1000)
+        ) + 'span'
+        self.cssparser._parse_selector(selector, collector)
+        self.assertEqual(collector.classes['classes'], {f'c{i}' for i in range(1000)})
+        self.assertEqual(collector.classes['startswith'], {f'p{i}"x' for i in range(1000)})
+        self.assertEqual(collector.ids['equal'], {f'i{i}' for i in range(1000)})
+        self.assertEqual(collector.ids['endswith'], {f's{i}' for i in range(1000)})
+
 
 class XMLParserTest(Parser):
 
@@ -246,6 +357,15 @@ class XMLParserTest(Parser):
             'idref_list_container_attrs': [],
         }
 
+    def assertSameValues(self, collector, expected):
+        """
+        Assert that two XHTMLAttributes collectors gathered the same values.
+        """
+        for attr in ('class_names', 'literal_class_values', 'id_values', 'fragment_identifier',
+                     'info_class_names', 'info_id_values'):
+            with self.subTest(attr=attr):
+                self.assertEqual(getattr(collector, attr), getattr(expected, attr))
+
     def test_xhtml_parse(self):
         self.bk.text_iter.side_effect = lambda: bk_text_iter([('xhtml1', 'file_href1')])
         collector = core.parse_xhtml(self.bk, self.cssparser, self.css_collector, self.prefs)
@@ -291,10 +411,150 @@ class XMLParserTest(Parser):
                 else:
                     self.assertEqual(v, set())
 
+    def test_literal_class_value(self):
+        for classes, expected in (
+                (['aclass', 'anotherclass'], 'aclass anotherclass'),
+                (['a&b', 'a<b>'], 'a&amp;b a&lt;b&gt;'),
+                (['strangeone"'], 'strangeone"'),
+                (['strange"one\''], "strange&quot;one'"),
+        ):
+            with self.subTest(classes=classes):
+                self.assertEqual(core.literal_class_value(classes), expected)
+
+    def test_iter_references(self):
+        dispatch = core.reference_dispatch(['href', 'data'], ['data', 'list'], ['headers'])
+        self.assertEqual(dispatch['data'], (core.fragid_references, core.idref_references))
+        attributes = {
+            'href': 'file.xhtml#a%20b',
+            'src': 'image.png#not-configured',
+            'data': 'c',
+            'list': '',
+            'headers': ['d', 'e'],
+        }
+        self.assertEqual(list(core.iter_references(attributes, dispatch)), ['a b', 'c', 'd', 'e'])
+
+    def test_decode_fragid_memoized(self):
+        core.decode_fragid.cache_clear()
+        attributes = {'href': 'notes.xhtml#note%201'}
+        dispatch = core.reference_dispatch(['href'], [], [])
+        for _ in range(3):
+            self.assertEqual(list(core.iter_references(attributes, dispatch)), ['note 1'])
+        self.assertEqual(core.decode_fragid('notes.xhtml'), '')
+        info = core.decode_fragid.cache_info()
+        self.assertEqual((info.hits, info.misses), (2, 2))
+
+    def test_scan_xhtml_attributes_same_as_tree(self):
+        attrs_names = core.reference_attributes(self.prefs)
+        texts = [resources.markup_samples['xhtml1']]
+        texts.extend(path.read_text(encoding='utf-8') for path in sorted(EPUB_TEST_PATH.glob('*.xhtml')))
+        for i, text in enumerate(texts):
+            for gather_only_fragid in (False, True):
+                with self.subTest(file=i, gather_only_fragid=gather_only_fragid):
+                    self.assertEqual(
+                        core.scan_xhtml_attributes(text, *attrs_names, gather_only_fragid),
+                        core.extract_xhtml_attributes(core.GumboBackend().parse(text), *attrs_names, gather_only_fragid)
+                    )
+
+    def test_scan_xhtml_references(self):
+        attrs_names = core.reference_attributes(self.prefs)
+        texts = [resources.markup_samples['xhtml1']]
+        texts.extend(path.read_text(encoding='utf-8') for path in sorted(EPUB_TEST_PATH.glob('*.xhtml')))
+        for i, text in enumerate(texts):
+            with self.subTest(file=i):
+                references = core.scan_xhtml_references(text, *attrs_names)
+                tree_references = core.extract_xhtml_attributes(core.GumboBackend().parse(text), *attrs_names, True)
+                for key in ('classes', 'ids', 'literal_class_values', 'styles'):
+                    self.assertFalse(references[key])
+                # the scanner reports duplicates and values outside of tags, so compare sets
+                self.assertEqual(
+                    set(references['fragment_identifiers']), set(tree_references['fragment_identifiers'])
+                )
+
+    def test_xhtml_parse_stream_extractor(self):
+        self.bk.text_iter.side_effect = lambda: bk_text_iter([('xhtml1', 'file_href1')])
+        collector = core.parse_xhtml(self.bk, self.cssparser, core.CSSAttributes(), self.prefs)
+        self.prefs['xhtml_extractor'] = 'stream'
+        with patch('backends.gumbo_bs4.parse') as parse:
+            stream_collector = core.parse_xhtml(self.bk, self.cssparser, self.css_collector, self.prefs)
+        parse.assert_not_called()
+        self.assertSameValues(stream_collector, collector)
+        self.assertEqual(self.css_collector.classes['classes'], {'definedinstyleclass'})
+
+    def test_xhtml_parse_with_cache(self):
+        self.bk.text_iter.side_effect = lambda: bk_text_iter([('xhtml1', 'file_href1')])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'xhtml.sqlite'
+            cache = core.ExtractionCache(path)
+            collector = core.parse_xhtml(self.bk, self.cssparser, core.CSSAttributes(), self.prefs, cache=cache)
+            cache.save()
+            cache = core.ExtractionCache(path)
+            with patch('backends.gumbo_bs4.parse') as parse:
+                cached_collector = core.parse_xhtml(
+                    self.bk, self.cssparser, self.css_collector, self.prefs, cache=cache
+                )
+            parse.assert_not_called()
+        self.assertSameValues(cached_collector, collector)
+        self.assertEqual(self.css_collector.classes['classes'], {'definedinstyleclass'})
+
+    def test_xhtml_parse_in_parallel(self):
+        files = [('xhtml1', 'file_href1'), ('xhtml1_before_deletions', 'file_href2')]
+        self.bk.text_iter.side_effect = lambda: bk_text_iter(files)
+        collector = core.parse_xhtml(self.bk, self.cssparser, core.CSSAttributes(), self.prefs)
+        self.prefs['parallel_workers'] = 2
+        done = []
+        progress = core.Progress(lambda event, p: done.append(p.href) if event == 'file_done' else None)
+        with patch('core.PARALLEL_MIN_SIZE', 0), \
+                patch('core.extract_xhtml_in_pool', wraps=core.extract_xhtml_in_pool) as pool:
+            parallel_collector = core.parse_xhtml(
+                self.bk, self.cssparser, self.css_collector, self.prefs, progress=progress
+            )
+        pool.assert_called_once()
+        # every file is reported once, as soon as its worker is done
+        self.assertCountEqual(done, ['file_href1', 'file_href2'])
+        self.assertSameValues(parallel_collector, collector)
+        self.assertEqual(self.css_collector.classes['classes'], {'definedinstyleclass'})
+
+    def test_xhtml_parse_pool_fallback_progress(self):
+        files = [('xhtml1', 'file_href1'), ('xhtml1_before_deletions', 'file_href2')]
+        self.bk.text_iter.side_effect = lambda: bk_text_iter(files)
+        self.prefs['parallel_workers'] = 2
+        events = []
+        progress = core.Progress(lambda event, p: events.append(event))
+
+        def broken_pool(pending, attrs_names, max_workers, extractor, backend_name, on_done):
+            on_done(pending[0][0])
+            raise BrokenExecutor('a worker died')
+
+        with patch('core.PARALLEL_MIN_SIZE', 0), patch('core.extract_xhtml_in_pool', side_effect=broken_pool):
+            core.parse_xhtml(self.bk, self.cssparser, self.css_collector, self.prefs, progress=progress)
+        # the serial parsing starts counting from scratch
+        self.assertEqual(events.count('phase_started'), 2)
+        self.assertEqual(progress.done_files, len(files))
+        self.assertEqual(progress.done_bytes, progress.total_bytes)
+
+    def test_xhtml_parse_reads_files_lazily(self):
+        files = [('xhtml1', 'file_href1'), ('xhtml1_before_deletions', 'file_href2')]
+        self.bk.text_iter.side_effect = lambda: bk_text_iter(files)
+        events = []
+        self.bk.readfile.side_effect = lambda file_id: events.append(('read', file_id)) or bk_readfile(file_id)
+        progress = core.Progress(lambda event, p: events.append((event, p.href)))
+        core.parse_xhtml(self.bk, self.cssparser, self.css_collector, self.prefs, progress=progress)
+        # every file is read when its turn comes, and the total size isn't known
+        self.assertEqual(events, [
+            ('phase_started', None),
+            ('file_started', 'file_href1'), ('read', 'xhtml1'), ('file_done', 'file_href1'),
+            ('file_started', 'file_href2'), ('read', 'xhtml1_before_deletions'), ('file_done', 'file_href2'),
+            ('phase_done', None)
+        ])
+        self.assertIsNone(progress.total_bytes)
+        self.assertEqual(progress.done_bytes, sum(len(bk_readfile(file_id).encode()) for file_id, href in files))
+
     def test_xhtml_parse_unselected_file(self):
         self.bk.text_iter.side_effect = lambda: bk_text_iter([('xhtml1', 'file_href1')])
         self.prefs['parse_only_selected_files'] = True
-        collector = core.parse_xhtml(self.bk, self.cssparser, self.css_collector, self.prefs)
+        with patch('backends.gumbo_bs4.parse') as parse:
+            collector = core.parse_xhtml(self.bk, self.cssparser, self.css_collector, self.prefs)
+        parse.assert_not_called()
         self.assertEqual(collector.class_names, set())
         self.assertEqual(collector.literal_class_values, set())
         self.assertEqual(collector.id_values, set())
@@ -327,6 +587,26 @@ class XMLParserTest(Parser):
         self.assertEqual(collector.info_class_names, {})
         self.assertEqual(collector.info_id_values, {})
 
+    def test_xml_parse_namespaced_attributes(self):
+        self.bk.manifest_iter.side_effect = lambda: bk_manifest_iter(
+            [('svg1', 'file_href1', 'image/svg+xml')]
+        )
+        self.bk.text_iter.side_effect = lambda: bk_text_iter([])
+        self.prefs['fragid_container_attrs'] = ['xlink:href', 'xl:href']
+        collector = core.parse_xml(self.bk, core.XHTMLAttributes(), self.prefs)
+        self.assertEqual(collector.fragment_identifier, {'svg_link target', 'grad'})
+
+    def test_iter_xml_attributes(self):
+        attributes = list(core.iter_xml_attributes(resources.markup_samples['media_overlays1']))
+        self.assertEqual(len(attributes), 15)
+        self.assertEqual(
+            attributes[2],
+            {'id': 'seq_id', 'epub:textref': 'Section0003.xhtml#ch3_figure1', 'epub:type': 'figure'}
+        )
+        for data in ('', b'', ' \n', b'\r\n\t'):
+            with self.subTest(data=data):
+                self.assertEqual(list(core.iter_xml_attributes(data)), [])
+
     def test_match_attribute_selectors_classes(self):
         self.css_collector.classes = {
             'equal': {'some classes', 'some different classes'},
@@ -383,6 +663,210 @@ class XMLParserTest(Parser):
         for i in range(min(len(lines_before), len(lines_after))):
             self.assertEqual(lines_before[i], lines_after[i])
 
+    def test_delete_xhtml_attributes_skips_unchanged_files(self):
+        self.bk.text_iter.side_effect = lambda: bk_text_iter([('xhtml1', 'file_href1')])
+        self.bk.writefile.side_effect = None
+        attrs_to_delete = {
+            'classes': {'classnotinfile'},
+            'ids': {'idnotinfile'}
+        }
+        written_files = core.delete_xhtml_attributes(self.bk, attrs_to_delete, self.prefs)
+        self.bk.writefile.assert_not_called()
+        self.assertEqual(written_files, {'written': 0, 'skipped': 1})
+
+    def test_delete_xhtml_attributes_splice(self):
+        self.bk.text_iter.side_effect = lambda: bk_text_iter([('xhtml1', 'file_href1')])
+        self.bk.writefile.side_effect = None
+        self.prefs['rewrite_engine'] = 'splice'
+        attrs_to_delete = {
+            'classes': {'undefinedclass'},
+            'ids': {'undefinedid'}
+        }
+        written_files = core.delete_xhtml_attributes(self.bk, attrs_to_delete, self.prefs)
+        self.assertEqual(written_files, {'written': 1, 'skipped': 0})
+        self.assertEqual(
+            self.bk.writefile.call_args[0][1],
+            resources.markup_samples['xhtml1']
+            .replace('class="undefinedclass definedinstyleclass"', 'class="definedinstyleclass"')
+            .replace(' id="undefinedid"', '')
+        )
+
+    def test_splice_xhtml_attributes(self):
+        text = (
+            '<body class="a\n  b">\n<!-- <p class="a"> -->\n'
+            '<p\n  class=a id="x">1</p><p class="c  a&amp;b c">2</p>'
+            '<br class="a" /><p class="">3</p><style>p[id="x"] {}</style>\n</body>'
+        )
+        new_text, modified = core.splice_xhtml_attributes(text, {'a', 'a&b'}, {'x'})
+        self.assertTrue(modified)
+        self.assertEqual(
+            new_text,
+            '<body class="b">\n<!-- <p class="a"> -->\n'
+            '<p>1</p><p class="c c">2</p>'
+            '<br /><p>3</p><style>p[id="x"] {}</style>\n</body>'
+        )
+        self.assertEqual(core.splice_xhtml_attributes(text, set(), set()), (text.replace(' class=""', ''), True))
+        self.assertEqual(core.splice_xhtml_attributes('<p class="a">', {'b'}, {'x'}), ('<p class="a">', False))
+        # a whitespace stays between an unquoted value and the slash
+        self.assertEqual(
+            core.splice_xhtml_attributes('<div id=a class="b"/><div title=a\nclass="b" id="x"/>', {'b'}, {'x'}),
+            ('<div id=a /><div title=a\n/>', True)
+        )
+        self.assertEqual(
+            core.splice_xhtml_attributes('<div hidden class="b"/><div id="a" class=b>', {'b'}, set()),
+            ('<div hidden/><div id="a">', True)
+        )
+        # and only there
+        self.assertEqual(
+            core.splice_xhtml_attributes('<p title=t id="x"><p title=t class="b" id="x"\n>', {'b'}, {'x'}),
+            ('<p title=t><p title=t\n>', True)
+        )
+        self.assertEqual(
+            core.splice_xhtml_attributes('<p title=t id="x"class="c"><p title=t id="x" class="b" lang=en>', {'b'}, {'x'}),
+            ('<p title=t class="c"><p title=t lang=en>', True)
+        )
+
+    def test_splice_xhtml_attributes_duplicates(self):
+        # duplicates ignored by the parser are dropped with the attribute they repeat
+        self.assertEqual(
+            core.splice_xhtml_attributes('<p class="a" class="b"><p id="a" title="t" id="b">', {'a'}, {'a'}),
+            ('<p><p title="t">', True)
+        )
+        self.assertEqual(
+            core.splice_xhtml_attributes('<p class="a c" id=y class="b">', {'a'}, set()),
+            ('<p class="c" id=y>', True)
+        )
+        # and kept if it's kept too
+        text = '<p class="c" class="a" id="b" id="a">'
+        self.assertEqual(core.splice_xhtml_attributes(text, {'a'}, {'a'}), (text, False))
+
+    def test_splice_xhtml_attributes_character_references(self):
+        self.assertEqual(
+            core.splice_xhtml_attributes('<p class="a&#32;b &#32; c">', {'b'}, set()),
+            ('<p class="a c">', True)
+        )
+        self.assertEqual(
+            core.splice_xhtml_attributes('<p class="&#97; b&amp;c d">', {'d'}, set()),
+            ('<p class="&#97; b&amp;c">', True)
+        )
+
+    def test_deletion_plan(self):
+        attributes = {
+            'classes': {'aclass', 'anotherclass'},
+            'ids': {'anid'},
+            'info_classes': {
+                'aclass': {'file1': 5, 'file2': 3},
+                'anotherclass': {'file1': 4},
+                'unselectedclass': {'file3': 1}
+            },
+            'info_ids': {
+                'anid': {'file2': 1},
+                'unselectedid': {'file3': 1}
+            }
+        }
+        self.assertEqual(
+            core.deletion_plan(attributes),
+            {
+                'file1': {'classes': {'aclass', 'anotherclass'}, 'ids': set()},
+                'file2': {'classes': {'aclass'}, 'ids': {'anid'}}
+            }
+        )
+        self.assertIsNone(core.deletion_plan({'classes': {'aclass'}, 'ids': set()}))
+
+    def test_delete_xhtml_attributes_opens_only_planned_files(self):
+        self.bk.text_iter.side_effect = lambda: bk_text_iter(
+            [('xhtml1', 'file_href1'), ('xhtml1_before_deletions', 'file_href2')]
+        )
+        self.bk.writefile.side_effect = None
+        attrs_to_delete = {
+            'classes': {'undefinedclass'},
+            'ids': set(),
+            'info_classes': {'undefinedclass': {'file_href1': 1}},
+            'info_ids': {}
+        }
+        written_files = core.delete_xhtml_attributes(self.bk, attrs_to_delete, self.prefs)
+        self.bk.readfile.assert_called_once_with('xhtml1')
+        self.assertEqual(self.bk.writefile.call_args[0][0], 'xhtml1')
+        self.assertEqual(written_files, {'written': 1, 'skipped': 1})
+
+    def test_delete_xhtml_attributes_reuses_parsed_documents(self):
+        self.bk.text_iter.side_effect = lambda: bk_text_iter([('xhtml1', 'file_href1')])
+        documents = core.DocumentCache()
+        core.parse_xhtml(self.bk, self.cssparser, self.css_collector, self.prefs, documents)
+        self.assertIn('xhtml1', documents)
+        self.assertEqual(documents.size, core.estimated_tree_size(resources.markup_samples['xhtml1']))
+        self.bk.readfile.reset_mock()
+        attrs_to_delete = {
+            'classes': {'undefinedclass'},
+            'ids': {'undefinedid'},
+            'documents': documents
+        }
+        self.bk.writefile.side_effect = None
+        core.delete_xhtml_attributes(self.bk, attrs_to_delete, self.prefs)
+        self.bk.readfile.assert_not_called()
+        self.assertNotIn('xhtml1', documents)
+        written = self.bk.writefile.call_args[0][1]
+        self.assertNotIn('undefinedclass', written)
+        self.assertNotIn('undefinedid', written)
+
+    def test_delete_xhtml_attributes_progress(self):
+        self.bk.text_iter.side_effect = lambda: bk_text_iter(
+            [('xhtml1', 'file_href1'), ('xhtml1_before_deletions', 'file_href2')]
+        )
+        self.bk.writefile.side_effect = None
+        attrs_to_delete = {'classes': {'undefinedclass'}, 'ids': set()}
+        events = []
+        progress = core.Progress(lambda event, p: events.append((event, p.href, p.done_files, p.total_files)))
+        core.delete_xhtml_attributes(self.bk, attrs_to_delete, self.prefs, progress)
+        self.assertEqual(events, [
+            ('phase_started', None, 0, 2),
+            ('file_started', 'file_href1', 0, 2),
+            ('file_done', 'file_href1', 1, 2),
+            ('file_started', 'file_href2', 1, 2),
+            ('file_done', 'file_href2', 2, 2),
+            ('phase_done', None, 2, 2),
+        ])
+        self.assertEqual(progress.done_bytes, sum(len(c[0][1].encode()) for c in self.bk.writefile.call_args_list))
+
+        # cancelled while writing the first file
+        self.bk.writefile.reset_mock()
+        progress = core.Progress(lambda event, p: p.cancel() if event == 'file_started' else None)
+        with self.assertRaises(core.Cancelled):
+            core.delete_xhtml_attributes(self.bk, attrs_to_delete, self.prefs, progress)
+        self.bk.writefile.assert_called_once()
+        self.assertEqual(self.bk.writefile.call_args[0][0], 'xhtml1')
+
+    def test_find_attributes_to_delete_progress(self):
+        self.bk.css_iter.side_effect = lambda: bk_css_iter([('css1', 'href1')])
+        self.bk.text_iter.side_effect = lambda: bk_text_iter([('xhtml1', 'file_href1')])
+        self.bk.manifest_iter.side_effect = lambda: bk_manifest_iter(
+            [
+                ('xhtml1', 'file_href1', 'application/xhtml+xml'),
+                ('media_overlays1', 'file_href2', 'application/smil+xml')
+            ]
+        )
+        self.prefs['use_cache'] = False
+        phases = []
+        progress = core.Progress(
+            lambda event, p: phases.append((p.phase, p.done_files, p.done_bytes)) if event == 'phase_done' else None
+        )
+        core.find_attributes_to_delete(self.bk, self.prefs, progress)
+        self.assertEqual(phases, [
+            ('css', 1, len(resources.css_samples['css1'].encode())),
+            ('xhtml', 1, len(resources.markup_samples['xhtml1'].encode())),
+            ('xml', 1, len(resources.markup_samples['media_overlays1'].encode())),
+        ])
+
+        # cancelled before the xml files
+        progress = core.Progress(lambda event, p: p.cancel() if event == 'phase_done' and p.phase == 'xhtml' else None)
+        with patch('core.iter_xml_attributes') as iter_xml_attributes, self.assertRaises(core.Cancelled):
+            core.find_attributes_to_delete(self.bk, self.prefs, progress)
+        iter_xml_attributes.assert_not_called()
+
+        # out of time
+        with patch('progress.time.monotonic', side_effect=itertools.count(step=10)), \
+                self.assertRaises(core.TimeBudgetExceeded):
+            core.find_attributes_to_delete(self.bk, self.prefs, core.Progress(time_budget=15))
 
 # mock callbacks
 
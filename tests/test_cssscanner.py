@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# Copyright (c) 2026 Francesco Martini
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+import css_parser
+
+import cssscanner
+
+
+class CSSScannerTest(unittest.TestCase):
+
+    def selectors(self, css_text):
+        return list(cssscanner.iter_selectors(css_text))
+
+    def test_selectors_of_style_rules(self):
+        self.assertEqual(
+            self.selectors('p > .x, .y {color: red} /* .comment {} */ #z{}'),
+            ['p > .x', '.y', '#z']
+        )
+        self.assertEqual(self.selectors('[class="a,b"], :is(.c, .d) {}'), ['[class="a,b"]', ':is(.c, .d)'])
+        self.assertEqual(self.selectors('<!-- .cdo {} -->'), ['.cdo'])
+
+    def test_declaration_blocks_are_skipped(self):
+        self.assertEqual(
+            self.selectors('.a {content: "} .no {"; background: url(}.no{)} .b{} .c{color: red'),
+            ['.a', '.b', '.c']
+        )
+
+    def test_at_rules(self):
+        css_text = (
+            '@charset "utf-8"; @import url(x.css) print; @font-face {src: url(f.otf)}'
+            '@media print { .m {} @media (min-width: 10em) { .n {} } }'
+            '@supports (display: grid) { .s {} } @layer base { .l {} } @layer a, b;'
+            '@page :first { margin: 0 } @unknown { .u {} }'
+        )
+        self.assertEqual(self.selectors(css_text), ['.m', '.n', '.s', '.l'])
+
+    def test_nested_rules(self):
+        self.assertEqual(
+            self.selectors('.a { color: red; .b { color: blue } &:hover {} @media print { .c {} } }'),
+            ['.a', '.b', '&:hover', '.c']
+        )
+
+    def test_unicode_escapes(self):
+        self.assertEqual(self.selectors(r'.\31 23, .a\000031 b, .\e9 t\E9, #\@x {}'), ['.123', '.a1b', '.été', r'#\@x'])
+        # resolved characters that have a meaning in selectors stay escaped
+        self.assertEqual(self.selectors(r'.a\2e b, .a\20 b, [class="a\5d b"] {}'), [r'.a\.b', r'.a\ b', r'[class="a\]b"]'])
+
+    def test_whitespace_in_attribute_selectors(self):
+        self.assertEqual(
+            self.selectors('[ class = "x" ], [class ~= x], p[ id="y" ], [class= "x"], [\nclass\n|=\nx\n] {}'),
+            ['[class="x"]', '[class~=x]', 'p[id="y"]', '[class="x"]', '[class|=x]']
+        )
+        # whitespace in strings, escaped whitespace and flags are kept
+        self.assertEqual(
+            self.selectors(r'[ class = "a  b" i ] .c, [class= a\  ], [class=a\20 ] {}'),
+            ['[class="a  b" i] .c', r'[class=a\ ]', r'[class=a\ ]']
+        )
+
+    def test_errors(self):
+        for css_text in ('a.gibb,{}', '{}', '.a {} }', '.a; .b {}', '.x:not(.y, {}', '.a'):
+            with self.subTest(css_text=css_text):
+                self.assertRaises(cssscanner.CSSScanError, self.selectors, css_text)
+
+    def test_errors_as_css_parser(self):
+        parser = css_parser.CSSParser(raiseExceptions=True, validate=False)
+        malformed = (
+            'p..a {}', '.a# {}', '.a >> .b {}', '.-1 {}', '. {}', '# {}', 'p. a {}', 'a > > b {}',
+            'a + {}', '> a {}', '.a|b {}', '.a:not(p..b) {}', '[class=1a] {}', '.a[id]p {}',
+            '.a { color: }', '.a {color: red; margin: ;}', '.a {color}', '@media print { .a { color: } }'
+        )
+        for css_text in malformed:
+            with self.subTest(css_text=css_text):
+                self.assertRaises(Exception, parser.parseString, css_text)
+                self.assertRaises(cssscanner.CSSScanError, self.selectors, css_text)
+        well_formed = (
+            '.a, #b.c > p ~ d + e {}', '.\\31 a, #1a, .-a, .a\\:b {}', '*.a, *|a.b, |a.c {}',
+            '[class="a"].b, [ class ] {}', '.a:nth-child(2n+1), .b:not(.c), .d::before {}',
+            '.a {color: red !important; margin: 0;;}'
+        )
+        for css_text in well_formed:
+            with self.subTest(css_text=css_text):
+                parser.parseString(css_text)
+                self.selectors(css_text)
+
+    def test_accepted_unlike_css_parser(self):
+        # css nesting and empty custom properties are valid css
+        self.assertEqual(self.selectors('.a { --x: ; > .b { color: red } &.c {} }'), ['.a', '> .b', '&.c'])
+        self.assertEqual(self.selectors('.a:has(> .b), .c:is(.d, p > .e) {}'), ['.a:has(> .b)', '.c:is(.d, p > .e)'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# Copyright (c) 2026 Francesco Martini
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+
+import markupscanner
+
+
+class IterStartTagsTest(unittest.TestCase):
+
+    def test_tags_and_attributes(self):
+        text = (
+            '<?xml version="1.0"?><!DOCTYPE html><html>'
+            '<body class = \'x  y\' id=main><P CLASS="a&amp;b" class="dup" hidden/></body></html>'
+        )
+        tags = list(markupscanner.iter_start_tags(text))
+        self.assertEqual([tag.name for tag in tags], ['html', 'body', 'p'])
+        body, p = tags[1], tags[2]
+        self.assertEqual([(attr.name, attr.value) for attr in body.attributes], [('class', 'x  y'), ('id', 'main')])
+        self.assertEqual(text[body.attributes[0].space_start:body.attributes[0].end], " class = 'x  y'")
+        self.assertEqual(text[body.attributes[1].value_start:body.attributes[1].value_end], 'main')
+        # duplicate attributes are ignored, as in html5 parsers
+        self.assertEqual([(attr.name, attr.value) for attr in p.attributes], [('class', 'a&b'), ('hidden', '')])
+        self.assertEqual(p.attributes[0].raw_value, 'a&amp;b')
+        self.assertEqual([(attr.name, attr.value) for attr in p.attributes[0].duplicates], [('class', 'dup')])
+        self.assertEqual(text[p.attributes[0].duplicates[0].space_start:p.attributes[0].duplicates[0].end], ' class="dup"')
+        self.assertEqual(p.attributes[1].duplicates, ())
+        self.assertTrue(p.self_closing)
+        self.assertEqual(text[p.start:p.end], '<P CLASS="a&amp;b" class="dup" hidden/>')
+
+    def test_skip_comments_cdata_and_raw_text(self):
+        text = (
+            '<head><style>p > .a {}</style><title>a <b>title</b></title></head>'
+            '<!-- <p class="comment"> --><![CDATA[<p class="cdata">]]><style/><p class="after">'
+        )
+        tags = list(markupscanner.iter_start_tags(text))
+        self.assertEqual([tag.name for tag in tags], ['head', 'style', 'title', 'style', 'p'])
+        self.assertEqual(tags[1].content, 'p > .a {}')
+        self.assertEqual(tags[2].content, 'a <b>title</b>')
+        self.assertIsNone(tags[3].content)
+        self.assertEqual(tags[4].attributes[0].value, 'after')
+
+    def test_unterminated_tag(self):
+        tags = list(markupscanner.iter_start_tags('<p class="a">text<span class="b"'))
+        self.assertEqual([tag.name for tag in tags], ['p'])
+
+    def test_iter_attribute_values(self):
+        text = (
+            '<A HREF="#a&amp;b" data-href="#no" xlink:href=\'#c\'/><td headers = d>'
+            '<p class="x"for="e f"><!-- <a href="#in-comment"> -->'
+        )
+        self.assertEqual(
+            list(markupscanner.iter_attribute_values(text, {'href', 'xlink:href', 'headers', 'for'})),
+            [('href', '#a&b'), ('xlink:href', '#c'), ('headers', 'd'), ('for', 'e f'), ('href', '#in-comment')]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# Copyright (c) 2026 Francesco Martini
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+
+import matchers
+
+
+class AhoCorasickTest(unittest.TestCase):
+
+    def test_search(self):
+        automaton = matchers.AhoCorasick({'ch_red', 'red-', 'he', 'she', 'hers'})
+        for text, expected in (
+                ('text_ch_red', True),
+                ('red-text', True),
+                ('ushers', True),
+                ('ch_re', False),
+                ('red', False),
+                ('', False),
+        ):
+            with self.subTest(text=text):
+                self.assertEqual(automaton.search(text), expected)
+
+    def test_search_overlapping_patterns(self):
+        # 'abcd' fails after 'abc', the failure link must still find 'bce'
+        automaton = matchers.AhoCorasick({'abcd', 'bce'})
+        self.assertTrue(automaton.search('abce'))
+        self.assertFalse(automaton.search('abcbd'))
+
+    def test_empty_pattern(self):
+        automaton = matchers.AhoCorasick({''})
+        self.assertTrue(automaton.search('anything'))
+        self.assertTrue(automaton.search(''))
+
+
+class PrefixSuffixIndexTest(unittest.TestCase):
+
+    def test_prefix(self):
+        index = matchers.PrefixIndex({'chapter0', 'aprefix'})
+        self.assertTrue(index.match('chapter01'))
+        self.assertTrue(index.match('aprefix'))
+        self.assertFalse(index.match('chapter10'))
+        self.assertFalse(index.match('apref'))
+        self.assertFalse(matchers.PrefixIndex(set()).match('chapter01'))
+
+    def test_dash_prefix(self):
+        index = matchers.PrefixIndex({'lang', 'en-us'})
+        for text, expected in (
+                ('lang', True),
+                ('lang-it', True),
+                ('en-us-x', True),
+                ('language', False),
+                ('langlang-', False),
+                ('en', False),
+        ):
+            with self.subTest(text=text):
+                self.assertEqual(index.match_dash(text), expected)
+
+    def test_suffix(self):
+        index = matchers.SuffixIndex({'asuffix', '-note'})
+        self.assertTrue(index.match('classwithasuffix'))
+        self.assertTrue(index.match('foot-note'))
+        self.assertFalse(index.match('classwithanothersuffix'))
+        self.assertFalse(index.match('footnote'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# Copyright (c) 2026 Francesco Martini
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import threading
+import unittest
+from unittest.mock import patch
+
+import progress
+
+
+class ProgressTest(unittest.TestCase):
+
+    def test_events(self):
+        events = []
+        p = progress.Progress(lambda event, p: events.append((event, p.phase, p.href, p.done_files, p.done_bytes)))
+        p.start_phase('xhtml', 2, 30)
+        p.start_file('Text/a.xhtml')
+        p.file_done('Text/a.xhtml', 10)
+        p.file_done('Text/b.xhtml', 20)
+        p.end_phase()
+        self.assertEqual(events, [
+            ('phase_started', 'xhtml', None, 0, 0),
+            ('file_started', 'xhtml', 'Text/a.xhtml', 0, 0),
+            ('file_done', 'xhtml', 'Text/a.xhtml', 1, 10),
+            ('file_done', 'xhtml', 'Text/b.xhtml', 2, 30),
+            ('phase_done', 'xhtml', None, 2, 30),
+        ])
+        self.assertEqual((p.total_files, p.total_bytes), (2, 30))
+
+    def test_cancel_from_another_thread(self):
+        p = progress.Progress()
+        p.start_phase('css', 1)
+        thread = threading.Thread(target=p.cancel)
+        thread.start()
+        thread.join()
+        self.assertTrue(p.is_cancelled())
+        with self.assertRaises(progress.Cancelled):
+            p.start_file('Styles/a.css')
+
+    def test_time_budget(self):
+        with patch('progress.time.monotonic', return_value=100):
+            p = progress.Progress(time_budget=5)
+            p.start_phase('css', 1)
+        with patch('progress.time.monotonic', return_value=105):
+            p.start_file('Styles/a.css')
+        with patch('progress.time.monotonic', return_value=106), \
+                self.assertRaisesRegex(progress.TimeBudgetExceeded, 'css phase'):
+            p.start_file('Styles/b.css')
+        # no budget
+        p = progress.Progress(time_budget=0)
+        with patch('progress.time.monotonic', return_value=10 ** 9):
+            p.check()
+
+    def test_text_size(self):
+        self.assertEqual(progress.text_size('àb'), 3)
+        self.assertEqual(progress.text_size(b'ab'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,6 +19,8 @@
 
 
 import os
+import time
+import threading
 import unittest
 from unittest.mock import MagicMock, patch
 
@@ -30,7 +32,7 @@ from plugin_utils import (
 import ui
 import core
 import utils
-from wrappingcheckbox import WrappingCheckBox
+from attributesview import AttributesModel, AttributesView
 
 class MainWindowTestCase(unittest.TestCase):
 
@@ -41,6 +43,15 @@ class MainWindowTestCase(unittest.TestCase):
         prefs = MagicMock()
         self.root = ui.MainWindow(bk, prefs)
 
+    def wait_for_task(self, timeout=5):
+        """
+        Process events until the task started by the window is done.
+        """
+        deadline = QtCore.QDeadlineTimer(timeout * 1000)
+        while self.root.task_thread is not None:
+            self.assertFalse(deadline.hasExpired(), 'the task is still running')
+            QtWidgets.QApplication.processEvents(QtCore.QEventLoop.AllEvents, 50)
+
     def test_proceed_select_proceed(self):
         """
         User launches the plugin,
@@ -62,48 +73,165 @@ class MainWindowTestCase(unittest.TestCase):
         }
         with patch('core.find_attributes_to_delete', return_value=attributes):
             self.root.ok_button.click()
-        self.assertNotEqual(self.root.check_undefined_attributes['classes'], {})
-        for k, v in self.root.check_undefined_attributes['classes'].items():
-            with self.subTest(type='classes', key=k, val=v):
-                self.assertIn(k, attributes['classes'])
-                self.assertIsInstance(v, WrappingCheckBox)
-                self.assertEqual(v.isChecked(), True)
-        self.assertNotEqual(self.root.check_undefined_attributes['ids'], {})
-        for k, v in self.root.check_undefined_attributes['ids'].items():
-            with self.subTest(type='ids', key=k, val=v):
-                self.assertIn(k, attributes['ids'])
-                self.assertIsInstance(v, WrappingCheckBox)
-                self.assertEqual(v.isChecked(), True)
-
-        for i in range(self.root.classes_frame_layout.count()):
-            widget = self.root.classes_frame_layout.itemAt(i).widget()
-            if isinstance(widget, WrappingCheckBox):
-                # in WrappingCheckBoxes, setting text on the label
-                # is delayed until the widget's show event and the
-                # text is split into words and stored
-                # in the label._text['words'] list.
-                if ''.join(widget.label._text['words']).startswith('anotherclass'):
-                    widget.checkbox.click()
-        self.assertNotEqual(self.root.check_undefined_attributes['classes'], {})
-        for k, v in self.root.check_undefined_attributes['classes'].items():
-            with self.subTest(type='classes', key=k, val=v):
-                self.assertIn(k, attributes['classes'])
-                self.assertIsInstance(v, WrappingCheckBox)
-                if k == 'anotherclass':
-                    self.assertEqual(v.isChecked(), False)
-                else:
-                    self.assertEqual(v.isChecked(), True)
-        self.assertNotEqual(self.root.check_undefined_attributes['ids'], {})
-        for k, v in self.root.check_undefined_attributes['ids'].items():
-            with self.subTest(type='ids', key=k, val=v):
-                self.assertIn(k, attributes['ids'])
-                self.assertIsInstance(v, WrappingCheckBox)
-                self.assertEqual(v.isChecked(), True)
-
-        with patch('core.delete_xhtml_attributes'):
+            self.assertFalse(self.root.ok_button.isEnabled())
+            self.wait_for_task()
+        self.assertTrue(self.root.ok_button.isEnabled())
+        for attr_type in ('classes', 'ids'):
+            model = self.root.attributes_models[attr_type]
+            self.assertIsInstance(model, AttributesModel)
+            self.assertEqual(model.rowCount(), len(attributes[attr_type]))
+            for row in range(model.rowCount()):
+                with self.subTest(type=attr_type, row=row):
+                    self.assertIn(model.name(row), attributes[attr_type])
+                    self.assertTrue(model.isChecked(row))
+        self.assertEqual(
+            self.root.attributes_models['classes'].index(0).data(Qt.DisplayRole),
+            'aclass  -  Found in: Section0001.xhtml (5), Section0002.xhtml (3)'
+        )
+
+        # rows are toggled by the space key (or by a click anywhere on them)
+        model = self.root.attributes_models['classes']
+        view = next(view for view in self.root.findChildren(AttributesView) if view.model() is model)
+        row = [model.name(row) for row in range(model.rowCount())].index('anotherclass')
+        view.setCurrentIndex(model.index(row))
+        QtWidgets.QApplication.sendEvent(
+            view, QtGui.QKeyEvent(QtCore.QEvent.KeyPress, Qt.Key_Space, Qt.NoModifier, ' ')
+        )
+        for attr_type in ('classes', 'ids'):
+            model = self.root.attributes_models[attr_type]
+            for row in range(model.rowCount()):
+                with self.subTest(type=attr_type, row=row):
+                    self.assertEqual(model.isChecked(row), model.name(row) != 'anotherclass')
+        self.assertEqual(self.root.attributes_models['classes'].uncheckedAttributes(), ['anotherclass'])
+
+        self.root.toggle_ids.setChecked(False)
+        self.assertEqual(self.root.attributes_models['ids'].uncheckedAttributes(), ['anid', 'anotherid'])
+        self.root.toggle_ids.setChecked(True)
+        self.assertEqual(self.root.attributes_models['ids'].uncheckedAttributes(), [])
+
+        with patch('core.delete_xhtml_attributes', return_value={'written': 1, 'skipped': 1}) as delete:
             self.root.ok_button.click()
+            self.wait_for_task()
         self.assertEqual(self.root.undefined_attributes['classes'], {'aclass'})
         self.assertEqual(self.root.undefined_attributes['ids'], {'anid', 'anotherid'})
+        delete.assert_called_once()
+
+    def test_cancel_search(self):
+        """
+        User presses the 'Proceed' button,
+        then the 'Cancel' button while the search is running.
+        """
+        started = threading.Event()
+        files = ['Text/Section{:04}.xhtml'.format(i) for i in range(1, 101)]
+
+        def find_attributes_to_delete(bk, prefs, progress):
+            progress.start_phase('xhtml', len(files))
+            for href in files:
+                progress.start_file(href)
+                started.set()
+                time.sleep(0.01)
+                progress.file_done(href)
+            progress.end_phase()
+            return {'classes': set(), 'ids': set()}
+
+        with patch('core.find_attributes_to_delete', side_effect=find_attributes_to_delete):
+            self.root.ok_button.click()
+            self.assertTrue(started.wait(5))
+            QtWidgets.QApplication.processEvents()
+            self.assertTrue(self.root.progress_bar.isVisibleTo(self.root))
+            self.assertEqual(self.root.progress_bar.maximum(), len(files))
+            self.root.stop_button.click()
+            self.wait_for_task()
+        self.assertFalse(self.root.progress_bar.isVisibleTo(self.root))
+        self.assertTrue(self.root.ok_button.isEnabled())
+        self.assertTrue(self.root.prefs_button.isEnabled())
+        # the search didn't complete
+        self.assertEqual(self.root.attributes_models, {})
+        self.assertIn('cancelled', self.root.top_label.text())
+
+    def test_close_during_deletion(self):
+        """
+        User closes the window while the deletion is running:
+        the plugin must exit with a non-zero status.
+        """
+        started = threading.Event()
+        files = ['Text/Section{:04}.xhtml'.format(i) for i in range(1, 101)]
+
+        def delete_xhtml_attributes(bk, attributes, prefs, progress):
+            progress.start_phase('delete', len(files))
+            for href in files:
+                progress.start_file(href)
+                started.set()
+                time.sleep(0.01)
+                progress.file_done(href)
+            progress.end_phase()
+            return {'written': len(files), 'skipped': 0}
+
+        self.root.undefined_attributes = {'classes': {'aclass'}, 'ids': set()}
+        with patch('core.delete_xhtml_attributes', side_effect=delete_xhtml_attributes), \
+                patch.object(QtWidgets.QApplication, 'exit') as app_exit:
+            self.root.delete_selected_attributes()
+            self.assertTrue(started.wait(5))
+            self.root.close()
+        self.assertIsNone(self.root.task_thread)
+        self.assertTrue(self.root.deletion_interrupted)
+        app_exit.assert_called_once_with(1)
+
+
+    def test_deletion_error_resets_selected_files(self):
+        """
+        The deletion fails: the selected files are reset
+        in the preferences as if it had succeeded.
+        """
+        self.root.prefs = {'selected_files': ['Text/Section0001.xhtml']}
+        self.root.undefined_attributes = {'classes': {'aclass'}, 'ids': set()}
+        error = core.XMLParsingError('Error in Section0001.xhtml')
+        with patch('core.delete_xhtml_attributes', side_effect=error), \
+                patch.object(QtWidgets.QMessageBox, 'exec'), \
+                patch.object(QtWidgets.QApplication, 'exit') as app_exit:
+            self.root.delete_selected_attributes()
+            self.wait_for_task()
+        self.assertEqual(self.root.prefs['selected_files'], [])
+        self.root.bk.savePrefs.assert_called_once_with(self.root.prefs)
+        app_exit.assert_called_once_with(2)
+
+class AttributesDelegateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        if not QtWidgets.QApplication.instance():
+            self.app = QtWidgets.QApplication([])
+        attributes = {'classes': {'short', 'long' + 'x' * 30 + ' word' * 200}}
+        self.model = AttributesModel(attributes, 'classes')
+        self.delegate = ui.AttributesView().itemDelegate()
+
+    def size_hints(self, width):
+        option = QtWidgets.QStyleOptionViewItem()
+        option.rect = QtCore.QRect(0, 0, width, 20)
+        option.font = QtWidgets.QApplication.font()
+        option.fontMetrics = QtGui.QFontMetrics(option.font)
+        return [self.delegate.sizeHint(option, self.model.index(row)) for row in range(self.model.rowCount())]
+
+    def test_resize_measures_wrapped_rows_once_per_step(self):
+        """
+        Rows in one line are never laid out, wrapped rows only
+        when the width crosses a step.
+        """
+        layout = self.delegate._text_layout
+        with patch.object(self.delegate, '_text_layout', side_effect=layout) as text_layout:
+            long_size, short_size = self.size_hints(400)
+            self.assertEqual(text_layout.call_count, 1)
+            self.assertEqual(long_size.width(), 400)
+            self.assertGreater(long_size.height(), short_size.height())
+            # two steps span at most three of them
+            for width in range(400, 400 + 2 * self.delegate.width_step):
+                self.size_hints(width)
+            self.assertLessEqual(text_layout.call_count, 3)
+            narrow_long_size, narrow_short_size = self.size_hints(200)
+            self.assertGreater(narrow_long_size.height(), long_size.height())
+            self.assertEqual(narrow_short_size, QtCore.QSize(200, short_size.height()))
+            calls = text_layout.call_count
+            self.size_hints(400)
+            self.assertEqual(text_layout.call_count, calls)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# Copyright (c) 2026 Francesco Martini
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+from unittest.mock import patch
+
+from plugin_utils import QtWidgets, QtCore, QtGui
+import utils
+
+
+class TextCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        if not QtWidgets.QApplication.instance():
+            self.app = QtWidgets.QApplication([])
+        utils.cached_tokens.cache_clear()
+        utils.breakable_word.cache_clear()
+
+    def test_tokenize_text(self):
+        text = 'anid  -  Found in: chapter0001.xhtml (1)'
+        line = QtCore.QTextBoundaryFinder.BoundaryType.Line
+        tokens = utils.tokenize_text(text, line)
+        self.assertEqual(''.join(tokens), text)
+        self.assertEqual(tokens[-2:], ['chapter0001.xhtml ', '(1)'])
+        # callers get their own list
+        tokens.append('x')
+        with patch('utils.QtCore.QTextBoundaryFinder') as finder:
+            self.assertEqual(utils.tokenize_text(text, line), tokens[:-1])
+        finder.assert_not_called()
+
+    def test_breakable_word(self):
+        # the combining accent stays with its letter
+        self.assertEqual(utils.breakable_word('ab\u0301c'), 'a\u200Bb\u0301\u200Bc')
+        self.assertEqual(utils.breakable_word('ab\u0301c'), 'a\u200Bb\u0301\u200Bc')
+        self.assertEqual(utils.breakable_word.cache_info().hits, 1)
+
+    def test_compute_words_length(self):
+        font = QtGui.QFont()
+        words = ['Found ', 'in: ', 'chapter0001.xhtml ']
+        metrics = QtGui.QFontMetricsF(font)
+        self.assertEqual(utils.compute_words_length(words, font), [metrics.horizontalAdvance(w) for w in words])
+        bigger_font = QtGui.QFont(font)
+        bigger_font.setPointSizeF(font.pointSizeF() * 2)
+        bigger_lengths = utils.compute_words_length(words, bigger_font)
+        for length, bigger_length in zip(utils.compute_words_length(words, font), bigger_lengths):
+            self.assertGreater(bigger_length, length)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# Copyright (c) 2026 Francesco Martini
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+
+from plugin_utils import QtWidgets
+from wrappingcheckbox import WrappingLabel
+
+
+class WrappingLabelTest(unittest.TestCase):
+
+    def setUp(self):
+        if not QtWidgets.QApplication.instance():
+            self.app = QtWidgets.QApplication([])
+        self.label = WrappingLabel('anid  -  Found in: Section0001.xhtml (1), nav.xhtml (1)')
+
+    def expected_text(self, available_width):
+        text = self.label._text
+        return ''.join(
+            breakable if available_width < length else word
+            for word, breakable, length in zip(text['words'], text['breakable_words'], text['lengths'])
+        )
+
+    def test_compose_text(self):
+        lengths = sorted(set(self.label._text['lengths']))
+        widths = [0, 1, *lengths, *(length + 0.5 for length in lengths), *(length - 0.5 for length in lengths), 5000]
+        for width in widths:
+            with self.subTest(width=width):
+                self.label._length_index = -1
+                self.assertEqual(self.label._compose_text(width), self.expected_text(width))
+
+    def test_compose_text_only_when_needed(self):
+        length = max(self.label._text['lengths'])
+        wide = self.label._compose_text(length + 10)
+        self.assertEqual(wide, ''.join(self.label._text['words']))
+        # same words to break: nothing to update
+        self.assertIsNone(self.label._compose_text(length + 20))
+        narrow = self.label._compose_text(length - 0.5)
+        self.assertNotEqual(narrow, wide)
+        # the texts composed for every width are remembered
+        self.assertIs(self.label._compose_text(length + 30), wide)
+
+    def test_setText_resets_composed_texts(self):
+        self.label._compose_text(10)
+        self.label.setText('another text')
+        self.assertEqual(self.label.text(), self.expected_text(self.label.width() - 5))
+        self.assertEqual(list(self.label._text['composed_texts']), [self.label._length_index])
+
+
+if __name__ == '__main__':
+    unittest.main()